@@ -1,26 +1,203 @@
 import os
-from flask import Flask, render_template, request, jsonify, session
-from flask_socketio import SocketIO, join_room
+from services.startup import WarmUp, startup_profiler
+
+# Set A2A_STARTUP_PROFILE=1 to report import and initialization times per module
+if os.environ.get('A2A_STARTUP_PROFILE') == '1':
+    startup_profiler.start()
+
+from flask import Flask, render_template, request, jsonify, session, abort, g, stream_with_context
+from flask_socketio import SocketIO, join_room, emit
 from services.agent_manager import AgentManager
+from services.agent_registry import AgentRegistryStore
 from services.conversation_manager import ConversationManager
+from services.task_scheduler import TaskScheduler
+from services.shadow import ShadowMirror
+from services.event_log import ConversationEventLog
+from services.batch import run_batch
+from services.offload import dumps_bytes, estimate_message_size, offload_pool
+from services.ndjson import decode_ndjson, encode_ndjson
+from services.idempotency import IdempotencyKeyReusedError, IdempotencyStore
+from services.profiler import ProfileStore, SamplingProfiler
+from services.rate_limiter import rate_limiters
+from services.tracing import FileSpanExporter, InMemorySpanExporter, tracer
+from services.http_cache import StaticAssets, compress_response, make_etag, negotiate_encoding, strip_encoding_suffix
+import hmac
 import json
+import threading
+import uuid
 
 # Initialize Flask app
-app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+with startup_profiler.phase("create app"):
+    # Static files are served by serve_static below, fingerprinted and precompressed
+    app = Flask(__name__, static_folder=None)
+    socketio = SocketIO(app, cors_allowed_origins="*")
+    static_assets = StaticAssets(os.path.join(app.root_path, 'static'))
+
+# Tracing: A2A_TRACING=memory keeps recent spans for /api/debug/traces,
+# A2A_TRACING=file appends them to A2A_TRACE_FILE; anything else disables it
+with startup_profiler.phase("init tracing"):
+    tracing_mode = os.environ.get('A2A_TRACING', 'off')
+    trace_sample_rate = float(os.environ.get('A2A_TRACE_SAMPLE_RATE', '1.0'))
+    if tracing_mode == 'memory':
+        tracer.configure(InMemorySpanExporter(), sample_rate=trace_sample_rate)
+    elif tracing_mode == 'file':
+        tracer.configure(FileSpanExporter(os.environ.get('A2A_TRACE_FILE', 'traces.jsonl')), sample_rate=trace_sample_rate)
+
+# JSON responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get('A2A_COMPRESS_MIN_SIZE', '1024'))
+
+# The profiling endpoints are disabled unless A2A_DEBUG_TOKEN is set, and then
+# require the token in an X-Debug-Token header
+DEBUG_TOKEN = os.environ.get('A2A_DEBUG_TOKEN')
+MAX_PROFILE_SECONDS = 60.0
+request_profiles = ProfileStore()
+_profile_lock = threading.Lock()
 
 # Initialize managers
-agent_manager = AgentManager()
-conversation_manager = ConversationManager()
+with startup_profiler.phase("init managers"):
+    scheduler = TaskScheduler(
+        max_in_flight=int(os.environ.get('A2A_AGENT_MAX_IN_FLIGHT', '4')),
+        max_queue=int(os.environ.get('A2A_AGENT_MAX_QUEUE', '64')),
+        queue_timeout=float(os.environ.get('A2A_AGENT_QUEUE_TIMEOUT', '30'))
+    )
+    # Registered agents are kept in A2A_DATA_DIR so they survive restarts
+    agent_manager = AgentManager(
+        scheduler=scheduler,
+        store=AgentRegistryStore(os.environ.get('A2A_DATA_DIR', 'data')),
+        shadow=ShadowMirror()
+    )
+    conversation_manager = ConversationManager()
+    # Recent Socket.IO events per conversation, replayed to reconnecting clients
+    event_log = ConversationEventLog(max_events=int(os.environ.get('A2A_EVENT_LOG_SIZE', '200')))
+    # Parsing and serializing large agent payloads runs on a worker pool
+    offload_pool.configure(
+        mode=os.environ.get('A2A_OFFLOAD_MODE', 'thread'),
+        max_workers=int(os.environ.get('A2A_OFFLOAD_WORKERS', '2')),
+        threshold=int(os.environ.get('A2A_OFFLOAD_THRESHOLD', str(256 * 1024)))
+    )
+    # Replies to messages sent with an Idempotency-Key, kept for retried requests
+    idempotency_store = IdempotencyStore(ttl=float(os.environ.get('A2A_IDEMPOTENCY_TTL', '600')))
+
+# How long a retried request waits for the original one to finish
+IDEMPOTENCY_WAIT = 60.0
+
+# Batch submissions: messages processed at once (agent limits still apply) and
+# the largest number of messages accepted in one request
+BATCH_CONCURRENCY = int(os.environ.get('A2A_BATCH_CONCURRENCY', '16'))
+BATCH_MAX_ITEMS = 10000
+
+def _create_http_pool():
+    from services.a2a_client import get_http_client
+    get_http_client()
+
+# Work that would otherwise slow down the first requests runs in the background
+warm_up = WarmUp()
+warm_up.add_task("http_pool", _create_http_pool)
+warm_up.add_task("static_assets", static_assets.preload)
 
 # Enable CORS for all routes
 @app.after_request
 def add_cors_headers(response):
     response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Idempotency-Key, X-Debug-Token, X-Profile'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
     return response
 
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings, COMPRESS_MIN_SIZE)
+
+def debug_access_error():
+    """An error response if the request may not use the debug endpoints, else None."""
+    if not DEBUG_TOKEN:
+        return jsonify({
+            "error": "Profiling is not enabled",
+            "message": "Start the server with A2A_DEBUG_TOKEN set to use the profiling endpoints."
+        }), 404
+    if not hmac.compare_digest(request.headers.get('X-Debug-Token', ''), DEBUG_TOKEN):
+        return jsonify({"error": "Invalid or missing X-Debug-Token header"}), 403
+    return None
+
+# Per-request profiling: a POST to the messages endpoint with "X-Profile: 1" and
+# a valid debug token samples the thread handling it. The report is stored and
+# its id returned in the X-Profile-Id response header.
+@app.before_request
+def start_request_profile():
+    if (request.method == 'POST' and request.endpoint == 'messages'
+            and request.headers.get('X-Profile') == '1' and debug_access_error() is None):
+        g.profiler = SamplingProfiler(interval=0.001, thread_ids=[threading.get_ident()]).start()
+
+@app.after_request
+def finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        profile_id = uuid.uuid4().hex[:12]
+        request_profiles.add(profile_id, profiler.report())
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc):
+    # after_request is skipped when the view raises
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+def cached_json(resource, version, build):
+    """
+    Respond with build() as JSON under a strong ETag for the resource version,
+    or with 304 Not Modified if the client already has that version.
+    """
+    etag = make_etag(resource, version, request.query_string.decode())
+    for client_etag in request.if_none_match.as_set():
+        # The client may hold a compressed variant of the same version
+        if strip_encoding_suffix(client_etag) == etag:
+            response = app.response_class(status=304)
+            response.set_etag(client_etag)
+            response.vary.add('Accept-Encoding')
+            return response
+    
+    response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def json_response(data, size=0):
+    """Like jsonify, but large payloads are serialized on the offload pool."""
+    return app.response_class(offload_pool.run(dumps_bytes, data, size=size), mimetype='application/json')
+
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    # Content-hashed URLs let browsers cache static files until they change
+    if endpoint == 'static' and 'filename' in values:
+        fingerprint = static_assets.fingerprint(values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+@app.route('/static/<path:filename>', endpoint='static')
+def serve_static(filename):
+    asset = static_assets.get(filename)
+    if asset is None:
+        abort(404)
+    
+    encoding = negotiate_encoding(request.accept_encodings, available=asset.encoded)
+    etag = f"{asset.fingerprint}-{encoding}" if encoding else asset.fingerprint
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(asset.encoded.get(encoding, asset.data), mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if request.args.get('v') == asset.fingerprint:
+        response.headers['Cache-Control'] = StaticAssets.LONG_CACHE
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html', agents=agent_manager.list_agents())
@@ -33,53 +210,258 @@ def conversations():
         return jsonify(conversation.model_dump())
     else:
         # List all conversations
-        return jsonify([conv.model_dump() for conv in conversation_manager.list_conversations()])
+        return cached_json(
+            'conversations',
+            conversation_manager.version,
+            lambda: [conv.model_dump() for conv in conversation_manager.list_conversations()]
+        )
+
+@app.route('/api/conversations/export', methods=['GET'])
+def export_conversations():
+    """
+    Stream all conversations and messages as NDJSON.
+    
+    ?since= and ?until= (Unix timestamps) and ?agent_id= limit the export to
+    matching messages; ?gzip=1 returns a gzip-compressed file.
+    """
+    try:
+        since = float(request.args['since']) if 'since' in request.args else None
+        until = float(request.args['until']) if 'until' in request.args else None
+    except ValueError:
+        return jsonify({"error": "since and until must be Unix timestamps"}), 400
+    compress = request.args.get('gzip') == '1'
+    
+    records = conversation_manager.export_records(since, until, request.args.get('agent_id'))
+    response = app.response_class(
+        stream_with_context(encode_ndjson(records, compress=compress)),
+        mimetype='application/gzip' if compress else 'application/x-ndjson'
+    )
+    filename = 'conversations.ndjson.gz' if compress else 'conversations.ndjson'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@app.route('/api/conversations/import', methods=['POST'])
+def import_conversations():
+    """Load an NDJSON export (optionally gzip-compressed) into the conversation store."""
+    compressed = (request.headers.get('Content-Encoding') == 'gzip'
+                  or request.mimetype == 'application/gzip')
+    try:
+        counts = conversation_manager.import_records(decode_ndjson(request.stream, compressed))
+    except (ValueError, OSError, EOFError) as e:
+        # Records before the bad line have already been imported
+        return jsonify({"error": "Invalid import file", "message": str(e)}), 400
+    return jsonify(counts)
 
 @app.route('/api/conversations/<conversation_id>/messages', methods=['GET', 'POST'])
 def messages(conversation_id):
     if request.method == 'POST':
-        try:
+        # Continue the caller's trace if the request carries a traceparent header
+        with tracer.start_span(
+            "POST /api/conversations/<id>/messages",
+            {"conversation.id": conversation_id},
+            traceparent=request.headers.get('traceparent')
+        ) as span:
             # Send a new message
-            message_data = request.json
-            message = conversation_manager.create_message(
-                conversation_id=conversation_id,
-                role="user",
-                content=message_data.get('content', '')
-            )
-            
-            # Set agent_id in metadata if provided
-            if message_data.get('metadata', {}).get('agent_id'):
-                message.metadata['agent_id'] = message_data['metadata']['agent_id']
-            
-            # Add the user message to the conversation first
-            conversation_manager.add_message_to_conversation(message)
-            
-            # Process message with the appropriate agent
-            response = agent_manager.process_message(message)
-            
-            # Add the response to the conversation
-            conversation_manager.add_message_to_conversation(response)
-            
-            # Emit the response via WebSocket
-            # Convert to JSON string if it's an A2A protocol response
-            if hasattr(response, 'metadata') and response.metadata.get('is_a2a_raw_response'):
-                # Send the raw response for client-side processing
-                socketio.emit('message', json.dumps(response.content), room=conversation_id)
-            else:
-                # Send the normal message object
-                socketio.emit('message', response.model_dump(), room=conversation_id)
+            message_data = request.get_json(silent=True)
+            metadata = (message_data.get('metadata') or {}) if isinstance(message_data, dict) else None
+            content = message_data.get('content', '') if isinstance(metadata, dict) else None
+            agent_id = metadata.get('agent_id') if isinstance(metadata, dict) else None
+            if not isinstance(content, str) or not isinstance(agent_id, (str, type(None))):
+                return jsonify({
+                    "error": "Invalid message",
+                    "message": "Provide a JSON object with a 'content' string and an optional 'metadata' object"
+                }), 400
+            key = request.headers.get('Idempotency-Key') or message_data.get('client_message_id')
+            if not key:
+                return submit_message(span, conversation_id, content, agent_id)[0]
             
-            return jsonify(response.model_dump())
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return jsonify({
-                "error": str(e),
-                "message": f"Failed to process message: {str(e)}"
-            }), 500
+            # Keys are scoped to the conversation; reusing one for a different
+            # message is a client bug rather than a retry
+            span.set_attribute("idempotency.key", key)
+            store_key = f"{conversation_id}:{key}"
+            fingerprint = json.dumps([content, agent_id])
+            # Derived from the key, so a retry reuses the user message stored by a failed attempt
+            message_id = str(uuid.uuid5(uuid.NAMESPACE_URL, store_key))
+            for _ in range(2):
+                try:
+                    is_new, entry = idempotency_store.begin(store_key, fingerprint)
+                except IdempotencyKeyReusedError:
+                    return jsonify({"error": f"Idempotency key '{key}' was already used for a different message"}), 422
+                
+                if is_new:
+                    result, replied = submit_message(span, conversation_id, content, agent_id, message_id)
+                    if replied:
+                        idempotency_store.complete(store_key, entry, result.get_data())
+                    else:
+                        # Failed, or the agent could not be reached; let a retry process the message again
+                        idempotency_store.abandon(store_key, entry)
+                    return result
+                
+                # A retry: wait for the original request instead of sending the message again
+                if not entry.wait(IDEMPOTENCY_WAIT):
+                    response = jsonify({"error": "A request with this idempotency key is still in progress"})
+                    response.headers['Retry-After'] = '5'
+                    return response, 409
+                if entry.result is not None:
+                    span.set_attribute("idempotency.replayed", True)
+                    response = app.response_class(entry.result, mimetype='application/json')
+                    response.headers['Idempotent-Replayed'] = 'true'
+                    return response
+                # The original request failed, so try to take over the key
+            return jsonify({"error": "A request with this idempotency key failed"}), 409
     else:
+        return cached_json(
+            f'messages:{conversation_id}',
+            conversation_manager.message_version(conversation_id),
+            lambda: list_messages_json(conversation_id)
+        )
+
+def submit_message(span, conversation_id, content, agent_id=None, message_id=None):
+    """
+    Process a posted message and build the HTTP response for it.
+    
+    Returns the response and whether the agent replied; a system notice
+    (e.g. the agent was busy or unreachable) does not count as a reply.
+    """
+    try:
+        response = process_user_message(conversation_id, content, agent_id, message_id=message_id)
+        return json_response(response.model_dump(), size=estimate_message_size(response)), response.role != "system"
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        span.set_attribute("error", str(e))
+        return (jsonify({
+            "error": str(e),
+            "message": f"Failed to process message: {str(e)}"
+        }), 500), False
+
+@app.route('/api/messages/batch', methods=['POST'])
+def submit_message_batch():
+    """
+    Send many messages at once: {"items": [{"conversation_id", "content", "agent_id", "id"}]}.
+    
+    Results are streamed as NDJSON, one line per message as it completes.
+    Messages of the same conversation are processed in order; items without
+    a conversation_id get a new conversation each.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if (not isinstance(items, list) or not items
+            or not all(isinstance(item, dict) and isinstance(item.get('content'), str)
+                       and all(isinstance(item.get(key), (str, type(None))) for key in ('conversation_id', 'agent_id'))
+                       for item in items)):
+        return jsonify({
+            "error": "Invalid batch",
+            "message": "Provide a non-empty 'items' list of objects with a 'content' string "
+                       "and optional 'conversation_id' and 'agent_id' strings"
+        }), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({
+            "error": "Batch too large",
+            "message": f"A batch may contain at most {BATCH_MAX_ITEMS} messages"
+        }), 413
+    
+    def generate():
+        for result in run_batch(items, process_batch_item, BATCH_CONCURRENCY):
+            yield json.dumps(result) + "\n"
+    
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def process_batch_item(item):
+    """Process one message of a batch submission."""
+    conversation_id = item.get('conversation_id') or conversation_manager.create_conversation().id
+    with tracer.start_span("batch.message", {"conversation.id": conversation_id}):
+        response = process_user_message(conversation_id, item['content'], item.get('agent_id'), store_failures=False)
+    if response.role == "system":
+        # The agent was busy, rate limited or unreachable; report the first line of the notice
+        text = next((part.content for part in response.parts if part.type == "text"), "")
+        raise RuntimeError(text.strip().split("\n")[0] or "Failed to process message")
+    return {"conversation_id": conversation_id, "message": response.model_dump()}
+
+def process_user_message(conversation_id, content, agent_id=None, store_failures=True, message_id=None):
+    """
+    Store a user message, get the agent's reply, then store and broadcast it.
+    
+    Without store_failures, a system notice returned instead of a reply
+    (e.g. when the agent is busy) is returned but not stored or broadcast.
+    With a message_id, a user message already stored under that id (by an
+    earlier attempt) is sent again instead of being added a second time.
+    """
+    message = conversation_manager.get_message(conversation_id, message_id) if message_id else None
+    is_retry = message is not None
+    if not is_retry:
+        message = conversation_manager.create_message(
+            conversation_id=conversation_id,
+            role="user",
+            content=content
+        )
+        if message_id:
+            message.id = message_id
+        
+        # Set agent_id in metadata if provided
+        if agent_id:
+            message.metadata['agent_id'] = agent_id
+    
+    # Record the trace so a slow message can be looked up in the exported spans
+    trace_id = tracer.current_span().trace_id
+    if trace_id:
+        message.metadata['trace_id'] = trace_id
+    
+    # Add the user message to the conversation first
+    if not is_retry:
+        conversation_manager.add_message_to_conversation(message)
+    
+    # Process message with the appropriate agent
+    response = agent_manager.process_message(message)
+    if trace_id:
+        response.metadata['trace_id'] = trace_id
+    if response.role == "system" and not store_failures:
+        return response
+    
+    # Add the response to the conversation
+    conversation_manager.add_message_to_conversation(response)
+    
+    emit_message(conversation_id, response)
+    return response
+
+def emit_message(conversation_id, response):
+    """Send an agent response to the browsers showing the conversation."""
+    with tracer.start_span("socketio.emit", {"conversation.id": conversation_id}):
+        # Convert to JSON string if it's an A2A protocol response
+        if hasattr(response, 'metadata') and response.metadata.get('is_a2a_raw_response'):
+            # Send the raw response for client-side processing
+            payload = offload_pool.run(json.dumps, response.content, size=estimate_message_size(response))
+        else:
+            # Send the normal message object
+            payload = response.model_dump()
+        emit_conversation_event(conversation_id, 'message', payload)
+
+def emit_conversation_event(conversation_id, event, payload):
+    """Emit an event to a conversation's room, numbered so it can be replayed after a reconnect."""
+    seq = event_log.append(conversation_id, event, payload)
+    # A tuple is sent as separate arguments: handlers receive (payload, meta)
+    socketio.emit(event, (payload, _event_meta(conversation_id, seq)), room=conversation_id)
+
+def _event_meta(conversation_id, seq):
+    return {"conversation_id": conversation_id, "seq": seq, "epoch": event_log.epoch}
+
+def list_messages_json(conversation_id):
+    limit = request.args.get('limit', type=int)
+    if limit is None:
         # List all messages in a conversation
-        return jsonify([msg.model_dump() for msg in conversation_manager.list_messages(conversation_id)])
+        return [msg.model_dump() for msg in conversation_manager.list_messages(conversation_id)]
+    
+    # Page backwards from the newest message; `before` is the cursor from the previous page
+    page, start = conversation_manager.list_messages_page(
+        conversation_id,
+        limit=limit,
+        before=request.args.get('before', type=int)
+    )
+    return {
+        "messages": [msg.model_dump() for msg in page],
+        "has_more": start > 0,
+        "next_before": start
+    }
 
 @app.route('/api/agents', methods=['GET', 'POST'])
 def agents():
@@ -123,7 +505,11 @@ def agents():
             }), 500
     else:
         # List all available agents
-        return jsonify([agent.model_dump() for agent in agent_manager.list_agents()])
+        return cached_json(
+            'agents',
+            agent_manager.version,
+            lambda: [agent.model_dump() for agent in agent_manager.list_agents()]
+        )
 
 @app.route('/api/agents/register-from-url', methods=['POST'])
 def register_agent_from_url():
@@ -180,150 +566,15 @@ def test_agent_connection():
                 "error": "Missing URL parameter",
                 "message": "Please provide a URL to test"
             }), 400
-            
-        import httpx
-        import traceback
-        
-        diagnostic_info = {
-            "url": url,
-            "steps": [],
-            "success": False,
-            "error": None,
-            "agent_data": None
-        }
-        
-        # Step 1: Validate URL format
-        if not url.startswith(('http://', 'https://')):
-            url = 'http://' + url
-            diagnostic_info["steps"].append({
-                "step": "URL Formatting",
-                "status": "Modified",
-                "message": f"Added http:// prefix: {url}"
-            })
-        else:
-            diagnostic_info["steps"].append({
-                "step": "URL Formatting",
-                "status": "Valid",
-                "message": "URL has valid protocol prefix"
-            })
-        
-        # Step 2: Remove trailing slashes
-        original_url = url
-        url = url.rstrip('/')
-        if original_url != url:
-            diagnostic_info["steps"].append({
-                "step": "URL Cleaning",
-                "status": "Modified",
-                "message": f"Removed trailing slashes: {url}"
-            })
-        else:
-            diagnostic_info["steps"].append({
-                "step": "URL Cleaning",
-                "status": "Valid",
-                "message": "URL had no trailing slashes"
-            })
-        
-        # Step 3: Determine URL paths to try
-        urls_to_try = []
-        
-        # Check if URL already ends with agent.json
-        if url.endswith('agent.json'):
-            urls_to_try.append((url, "Direct agent.json URL"))
-        else:
-            # Try well-known path first, then base URL
-            urls_to_try.append((f"{url}/.well-known/agent.json", "Well-known path"))
-            urls_to_try.append((url, "Base URL"))
-            
-        diagnostic_info["steps"].append({
-            "step": "URL Resolution",
-            "status": "Info",
-            "message": f"Will try {len(urls_to_try)} URL variations"
-        })
-        
-        # Step 4: Try each URL
-        agent_data = None
-        success = False
         
-        for test_url, description in urls_to_try:
-            try:
-                response = httpx.get(test_url, timeout=10.0)
-                status_code = response.status_code
-                reason = response.reason_phrase
-                
-                diagnostic_info["steps"].append({
-                    "step": f"Connection Attempt ({description})",
-                    "status": "Success" if response.is_success else "Failed",
-                    "message": f"HTTP {status_code} {reason}",
-                    "details": {
-                        "url": test_url,
-                        "status_code": status_code,
-                        "reason": reason
-                    }
-                })
-                
-                if response.is_success:
-                    try:
-                        # Parse JSON
-                        data = response.json()
-                        
-                        # Check required fields
-                        if "name" in data:
-                            agent_data = data
-                            success = True
-                            diagnostic_info["steps"].append({
-                                "step": "Agent Validation",
-                                "status": "Success",
-                                "message": f"Found valid agent: {data.get('name')}"
-                            })
-                            
-                            # Add URL field if missing
-                            if "url" not in agent_data:
-                                # Use the base URL, not the agent.json URL
-                                base_url = url
-                                agent_data["url"] = base_url
-                                diagnostic_info["steps"].append({
-                                    "step": "URL Field",
-                                    "status": "Modified",
-                                    "message": f"Added missing URL field: {base_url}"
-                                })
-                            
-                            # Break the loop - we found a valid agent
-                            break
-                        else:
-                            diagnostic_info["steps"].append({
-                                "step": "Agent Validation",
-                                "status": "Failed",
-                                "message": "Response missing required 'name' field"
-                            })
-                    except ValueError:
-                        diagnostic_info["steps"].append({
-                            "step": "JSON Parsing",
-                            "status": "Failed",
-                            "message": "Response is not valid JSON"
-                        })
-            except httpx.TimeoutError:
-                diagnostic_info["steps"].append({
-                    "step": f"Connection Attempt ({description})",
-                    "status": "Failed",
-                    "message": "Connection timed out after 10 seconds"
-                })
-            except httpx.RequestError as e:
-                diagnostic_info["steps"].append({
-                    "step": f"Connection Attempt ({description})",
-                    "status": "Failed",
-                    "message": f"Request error: {str(e)}"
-                })
+        # Rarely used, so the diagnostics engine is only imported on first use
+        from services.diagnostics import run_diagnostics
         
-        # Final result
-        if success:
-            diagnostic_info["success"] = True
-            diagnostic_info["agent_data"] = agent_data
-            return jsonify(diagnostic_info), 200
-        else:
-            diagnostic_info["error"] = "Could not find a valid agent at any of the tried URLs"
-            return jsonify(diagnostic_info), 400
+        diagnostic_info = run_diagnostics(url, include_task_probe=bool(data.get('task_probe')))
+        return jsonify(diagnostic_info), 200 if diagnostic_info["success"] else 400
         
     except Exception as e:
+        import traceback
         traceback.print_exc()
         return jsonify({
             "success": False,
@@ -331,12 +582,177 @@ def test_agent_connection():
             "message": "An unexpected error occurred during connection test"
         }), 500
 
+@app.route('/api/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    """Queue depth, in-flight tasks and wait times per agent."""
+    return jsonify(scheduler.stats())
+
+@app.route('/api/scheduler/agents/<agent_id>', methods=['PUT'])
+def set_agent_concurrency(agent_id):
+    """Set the maximum number of in-flight tasks for an agent."""
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Provide a JSON object with 'max_in_flight'")
+        scheduler.set_agent_limit(agent_id, int(data.get('max_in_flight', 0)))
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            "error": "Invalid concurrency limit",
+            "message": str(e)
+        }), 400
+    return jsonify(scheduler.stats().get(agent_id, {}))
+
+@app.route('/api/tasks/pending', methods=['GET'])
+def pending_tasks():
+    """Poll the agents for the status of unfinished tasks, batched per agent."""
+    return jsonify(agent_manager.poll_pending_tasks())
+
+@app.route('/api/shadow', methods=['GET'])
+def shadow_stats():
+    """Primary vs. candidate latency, error rate and response size per shadowed agent."""
+    return jsonify(agent_manager.shadow.stats())
+
+@app.route('/api/shadow/agents/<agent_id>', methods=['PUT', 'DELETE'])
+def configure_shadow(agent_id):
+    """Mirror a fraction of an agent's tasks to a candidate URL, or stop doing so."""
+    if request.method == 'DELETE':
+        if not agent_manager.shadow.remove(agent_id):
+            return jsonify({"error": f"Agent {agent_id} is not shadowed"}), 404
+        return jsonify({"success": True})
+    
+    if agent_manager.get_agent(agent_id) is None:
+        return jsonify({"error": f"Agent {agent_id} not found"}), 404
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    candidate_url = data.get('candidate_url')
+    if not isinstance(candidate_url, str) or not candidate_url.startswith(('http://', 'https://')):
+        return jsonify({
+            "error": "Invalid shadow configuration",
+            "message": "candidate_url must be an http(s) URL"
+        }), 400
+    try:
+        agent_manager.shadow.configure(agent_id, candidate_url, float(data.get('sample_rate', 0.1)))
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            "error": "Invalid shadow configuration",
+            "message": str(e)
+        }), 400
+    return jsonify(agent_manager.shadow.stats()[agent_id])
+
+@app.route('/api/offload/stats', methods=['GET'])
+def offload_stats():
+    """Work run inline vs. on the offload pool, with queue and run times."""
+    return jsonify(offload_pool.stats())
+
+@app.route('/api/rate-limits', methods=['GET'])
+def rate_limit_stats():
+    """Current adaptive request rate per agent URL."""
+    return jsonify(rate_limiters.stats())
+
+@app.route('/api/debug/traces', methods=['GET'])
+def recent_traces():
+    """Recently finished spans, when tracing to memory is enabled."""
+    if not isinstance(tracer.exporter, InMemorySpanExporter):
+        return jsonify({
+            "error": "In-memory tracing is not enabled",
+            "message": "Start the server with A2A_TRACING=memory to collect spans here."
+        }), 404
+    return jsonify(tracer.exporter.get_spans(request.args.get('trace_id')))
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once background warm-up has finished, 503 before."""
+    status = warm_up.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/api/debug/startup-profile', methods=['GET'])
+def startup_profile():
+    """Import and initialization times recorded with A2A_STARTUP_PROFILE=1."""
+    return jsonify(startup_profiler.report())
+
+@app.route('/api/debug/profile', methods=['GET'])
+def profile_process():
+    """
+    Sample all threads for ?seconds=N (default 10) and report where time went.
+
+    ?format=collapsed returns plain collapsed stacks for flame graph tools;
+    ?mode=cpu only counts threads that were using CPU; ?idle=1 keeps samples
+    of threads blocked waiting.
+    """
+    error = debug_access_error()
+    if error is not None:
+        return error
+    try:
+        seconds = min(float(request.args.get('seconds', '10')), MAX_PROFILE_SECONDS)
+        interval = float(request.args.get('interval_ms', '10')) / 1000
+    except ValueError as e:
+        return jsonify({"error": "Invalid profiling parameters", "message": str(e)}), 400
+    if seconds <= 0 or interval <= 0:
+        return jsonify({"error": "seconds and interval_ms must be positive"}), 400
+    
+    # One profile at a time, so profiling cannot pile up load on the server
+    if not _profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already being recorded"}), 409
+    try:
+        profiler = SamplingProfiler(
+            interval=interval,
+            include_idle=request.args.get('idle') == '1',
+            cpu_only=request.args.get('mode') == 'cpu'
+        ).run(seconds)
+    finally:
+        _profile_lock.release()
+    
+    if request.args.get('format') == 'collapsed':
+        return app.response_class("\n".join(profiler.collapsed()) + "\n", mimetype='text/plain')
+    return jsonify(profiler.report())
+
+@app.route('/api/debug/profiles', methods=['GET'])
+@app.route('/api/debug/profiles/<profile_id>', methods=['GET'])
+def request_profile(profile_id=None):
+    """Reports of recently profiled requests (see X-Profile above)."""
+    error = debug_access_error()
+    if error is not None:
+        return error
+    if profile_id is None:
+        return jsonify(request_profiles.ids())
+    report = request_profiles.get(profile_id)
+    if report is None:
+        return jsonify({"error": f"Profile {profile_id} not found"}), 404
+    if request.args.get('format') == 'collapsed':
+        return app.response_class("\n".join(report["collapsed"]) + "\n", mimetype='text/plain')
+    return jsonify(report)
+
 @socketio.on('join')
 def on_join(data):
     # Join a conversation room
-    room = data.get('conversation_id')
-    if room:
-        join_room(room)
+    room = data.get('conversation_id') if isinstance(data, dict) else None
+    if not room or not isinstance(room, str):
+        return
+    join_room(room)
+    
+    last_seq = data.get('last_seq')
+    if last_seq is None:
+        # First join: tell the client where the event sequence currently stands
+        emit('joined', _event_meta(room, event_log.last_seq(room)))
+        return
+    
+    # Rejoin after a reconnect: replay only what the client missed. A
+    # malformed last_seq cannot be trusted, so the client reloads instead
+    missed = None
+    if isinstance(last_seq, (int, str)) and not isinstance(last_seq, bool):
+        try:
+            last_seq = int(last_seq)
+        except ValueError:
+            last_seq = -1
+        if last_seq >= 0:
+            missed = event_log.since(room, last_seq, data.get('epoch'))
+    if missed is None:
+        # Too far behind (or the server restarted); the client reloads the history
+        emit('resync', _event_meta(room, event_log.last_seq(room)))
+        return
+    for seq, event, payload in missed:
+        emit(event, (payload, _event_meta(room, seq)))
 
 @socketio.on('connect')
 def on_connect():
@@ -346,7 +762,25 @@ def on_connect():
 def on_disconnect():
     print("Client disconnected")
 
+startup_profiler.stop()
+
+def start_background_threads():
+    """Start the warm-up and the agent card refresher."""
+    warm_up.start()
+    
+    # Keep stored agent cards current without blocking requests (0 disables)
+    card_refresh_interval = float(os.environ.get('A2A_AGENT_REFRESH_INTERVAL', '300'))
+    if card_refresh_interval > 0:
+        agent_manager.start_card_refresher(card_refresh_interval)
+
+# When run directly, the debug reloader's parent process only watches files
+# and restarts the server in a child process, which sets WERKZEUG_RUN_MAIN
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    start_background_threads()
+
 if __name__ == '__main__':
     print("Starting A2A Client Application")
+    if startup_profiler.enabled:
+        startup_profiler.print_report()
     print(f"Number of agents available: {len(agent_manager.list_agents())}")
     socketio.run(app, debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
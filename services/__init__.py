@@ -1,4 +1,12 @@
-from .agent_manager import AgentManager
-from .conversation_manager import ConversationManager
+# Managers are loaded on first access so importing a single service module
+# (or the package itself) does not pull in every dependency at startup.
+__all__ = ['AgentManager', 'ConversationManager']
 
-__all__ = ['AgentManager', 'ConversationManager'] 
\ No newline at end of file
+def __getattr__(name):
+    if name == 'AgentManager':
+        from .agent_manager import AgentManager
+        return AgentManager
+    if name == 'ConversationManager':
+        from .conversation_manager import ConversationManager
+        return ConversationManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
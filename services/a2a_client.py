@@ -1,9 +1,19 @@
-import httpx
 import json
-from typing import Dict, Any, Optional
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 from models import AgentCard
+from services.offload import offload_pool
+from services.tracing import tracer
+from services.rate_limiter import AdaptiveRateLimiter, RateLimitExceeded, parse_retry_after, rate_limiters
 import uuid
 
+if TYPE_CHECKING:
+    import httpx
+
+# Maximum number of characters of a request or response body to print
+_LOG_PREVIEW_CHARS = 2000
+
 class A2AClientError(Exception):
     """Base class for A2A client errors"""
     def __init__(self, message):
@@ -16,14 +26,50 @@ class A2AClientHTTPError(A2AClientError):
         self.status_code = status_code
         super().__init__(f"HTTP error {status_code}: {message}")
 
+class A2AClientRateLimitError(A2AClientHTTPError):
+    """The agent stayed rate limited for longer than the client would wait"""
+    def __init__(self, status_code, message, retry_after):
+        self.retry_after = retry_after
+        super().__init__(status_code, message)
+
 class A2AClientJSONError(A2AClientError):
     """JSON parsing error from A2A client"""
     pass
 
+class A2AClientConnectionError(A2AClientHTTPError):
+    """The request did not reach the agent or got no response"""
+    def __init__(self, message):
+        super().__init__(500, message)
+
+# JSON-RPC error code reported for batch entries the agent did not answer
+_INTERNAL_ERROR = -32603
+
+# Agents that answered a JSON-RPC batch with an error; their requests are
+# sent one at a time from then on
+_batch_unsupported = set()
+
+# Shared connection pool, created on first use (or by the startup warm-up)
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def get_http_client() -> "httpx.Client":
+    """Return the process-wide HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                # httpx is imported here rather than at module load to keep startup fast
+                import httpx
+                _http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                )
+    return _http_client
+
 class A2AClient:
     """Client for interacting with A2A protocol compatible agents"""
     
-    def __init__(self, agent_card: AgentCard = None, url: str = None, auth_token: str = None):
+    def __init__(self, agent_card: AgentCard = None, url: str = None, auth_token: str = None,
+                 rate_limiter: AdaptiveRateLimiter = None, max_rate_limit_wait: float = 60.0):
         """Initialize the client with either an agent card or a URL"""
         if agent_card:
             self.url = agent_card.url.rstrip('/')
@@ -33,6 +79,11 @@ class A2AClient:
             raise ValueError("Must provide either agent_card or url")
             
         self.auth_token = auth_token
+        # Requests to the same agent share one limiter unless one is given explicitly
+        self.rate_limiter = rate_limiter or rate_limiters.get(self.url)
+        self.max_rate_limit_wait = max_rate_limit_wait
+        # Size in bytes of the last response body, for metrics
+        self.last_response_size = 0
     
     def send_task(self, payload: Dict[str, Any], task_id: str = None) -> Dict[str, Any]:
         """Send a task to the agent"""
@@ -69,7 +120,7 @@ class A2AClient:
         """Get the status of a task"""
         request = {
             "jsonrpc": "2.0",
-            "id": "1",
+            "id": str(uuid.uuid4()),
             "method": "tasks/get",
             "params": {
                 "id": task_id
@@ -78,51 +129,177 @@ class A2AClient:
         
         return self._send_request(request)
     
-    def _send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Send a JSON-RPC request to the agent"""
-        try:
-            print(f"Sending request to {self.url}: {json.dumps(request, indent=2)}")
+    def get_tasks(self, task_ids: List[str], max_batch_size: int = 100) -> Dict[str, Dict[str, Any]]:
+        """Get the status of many tasks, batching the requests. Returns responses by task id."""
+        requests = [
+            {"jsonrpc": "2.0", "method": "tasks/get", "params": {"id": task_id}}
+            for task_id in task_ids
+        ]
+        return dict(zip(task_ids, self.send_batch(requests, max_batch_size)))
+    
+    def send_batch(self, requests: List[Dict[str, Any]], max_batch_size: int = 100) -> List[Dict[str, Any]]:
+        """
+        Send JSON-RPC requests as batches of up to max_batch_size per POST.
+        
+        Returns one response per request, in the same order. Requests the agent
+        did not answer get a JSON-RPC error response (see
+        is_client_error_response). If the agent rejects batches, the requests
+        are sent one at a time instead.
+        """
+        responses: List[Dict[str, Any]] = []
+        for start in range(0, len(requests), max_batch_size):
+            chunk = requests[start:start + max_batch_size]
+            if self.url in _batch_unsupported or len(chunk) == 1:
+                responses.extend(self._send_each(chunk))
+                continue
             
-            headers = {'Content-Type': 'application/json'}
-            if self.auth_token:
-                headers['Authorization'] = f'Bearer {self.auth_token}'
-                
-            response = httpx.post(
-                self.url,
-                json=request,
-                headers=headers,
-                timeout=30.0
-            )
+            # Responses may come back in any order, so each request gets an id
+            # that is unique within the batch; the caller's ids are restored below
+            ids = [str(uuid.uuid4()) for _ in chunk]
+            batch = [dict(request, jsonrpc="2.0", id=rpc_id) for request, rpc_id in zip(chunk, ids)]
+            try:
+                result = self._send_request(batch)
+            except (A2AClientConnectionError, A2AClientRateLimitError):
+                raise
+            except (A2AClientHTTPError, A2AClientJSONError) as e:
+                result = e
             
-            # Print the raw response for debugging
-            print(f"Received HTTP {response.status_code}")
-            print(f"Response headers: {dict(response.headers)}")
+            if not isinstance(result, list):
+                # A client error status or a single JSON object means batches are not
+                # supported; anything else may be transient, so only this chunk falls back
+                if isinstance(result, dict) or (
+                        isinstance(result, A2AClientHTTPError) and 400 <= result.status_code < 500):
+                    print(f"Agent at {self.url} rejected a JSON-RPC batch, sending requests individually: {str(result)[:200]}")
+                    _batch_unsupported.add(self.url)
+                else:
+                    print(f"JSON-RPC batch to {self.url} failed, sending requests individually: {str(result)[:200]}")
+                responses.extend(self._send_each(chunk))
+                continue
             
+            by_id = {item.get("id"): item for item in result if isinstance(item, dict)}
+            for request, rpc_id in zip(chunk, ids):
+                response = by_id.get(rpc_id) or _error_response(rpc_id, "No response to this request in the batch")
+                responses.append(dict(response, id=request.get("id")))
+        return responses
+    
+    def _send_each(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send requests one by one, reporting agent errors per request."""
+        responses = []
+        for request in requests:
+            rpc_id = request.get("id") or str(uuid.uuid4())
             try:
-                # Try to get the response text even if it's not valid JSON
-                print(f"Response body: {response.text}")
-            except:
-                print("Could not read response text")
-                
-            response.raise_for_status()
+                response = self._send_request(dict(request, jsonrpc="2.0", id=rpc_id))
+            except (A2AClientConnectionError, A2AClientRateLimitError):
+                raise
+            except (A2AClientHTTPError, A2AClientJSONError) as e:
+                response = _error_response(rpc_id, e.message)
+            responses.append(dict(response, id=request.get("id")))
+        return responses
+    
+    def _send_request(self, request: Any) -> Any:
+        """Send a JSON-RPC request (or a list of them, as a batch) to the agent"""
+        method = "batch" if isinstance(request, list) else request.get("method")
+        with tracer.start_span("a2a.send_request", {"rpc.method": method, "http.url": self.url}) as span:
+            import httpx
             
-            result = response.json()
-            print(f"Parsed JSON response: {json.dumps(result, indent=2)}")
-            return result
-        except httpx.HTTPStatusError as e:
-            # Try to parse the error response JSON if available
-            error_detail = ""
+            deadline = time.monotonic() + self.max_rate_limit_wait
             try:
-                error_json = e.response.json()
-                error_detail = json.dumps(error_json)
-            except:
-                error_detail = e.response.text if hasattr(e.response, 'text') else ""
+                print(f"Sending request to {self.url}: {_preview(json.dumps(request))}")
+                
+                headers = {'Content-Type': 'application/json'}
+                if self.auth_token:
+                    headers['Authorization'] = f'Bearer {self.auth_token}'
+                if span.traceparent:
+                    # Propagate the trace so the agent's spans join ours
+                    headers['traceparent'] = span.traceparent
+                
+                while True:
+                    # Hold the request until the agent has capacity for it
+                    try:
+                        self.rate_limiter.acquire(timeout=max(0.0, deadline - time.monotonic()))
+                    except RateLimitExceeded as e:
+                        raise A2AClientRateLimitError(429, e.message, e.retry_after)
+                    
+                    response, body = self._post(request, headers)
+                    
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    if response.status_code == 429 or (response.status_code == 503 and retry_after is not None):
+                        # The agent is pushing back: slow down and try again once it allows
+                        print(f"Agent at {self.url} throttled the request (retry after {retry_after}s)")
+                        self.rate_limiter.on_throttle(retry_after)
+                        span.set_attribute("a2a.throttled", True)
+                        continue
+                    break
+                    
+                span.set_attribute("http.status_code", response.status_code)
+                span.set_attribute("http.response_size", len(body))
+                self.last_response_size = len(body)
                 
-            raise A2AClientHTTPError(
-                e.response.status_code, 
-                f"{str(e)}. Response: {error_detail}"
-            )
-        except json.JSONDecodeError as e:
-            raise A2AClientJSONError(f"Failed to parse JSON response: {str(e)}")
-        except httpx.RequestError as e:
-            raise A2AClientHTTPError(500, f"Request failed: {str(e)}") 
\ No newline at end of file
+                if response.is_error:
+                    # Try to parse the error response JSON if available
+                    try:
+                        error_detail = json.dumps(json.loads(body))
+                    except ValueError:
+                        error_detail = body.decode(errors="replace")
+                        
+                    raise A2AClientHTTPError(
+                        response.status_code,
+                        f"{response.reason_phrase} for url '{self.url}'. Response: {error_detail}"
+                    )
+                
+                self.rate_limiter.on_success(response.headers)
+                # Large responses are parsed on the offload pool
+                return offload_pool.parse(json.loads, body, size=len(body))
+            except json.JSONDecodeError as e:
+                raise A2AClientJSONError(f"Failed to parse JSON response: {str(e)}")
+            except httpx.RequestError as e:
+                raise A2AClientConnectionError(f"Request failed: {str(e)}")
+    
+    def _post(self, request: Any, headers: Dict[str, str]) -> Tuple["httpx.Response", bytearray]:
+        """POST a JSON-RPC payload and return the response with its body."""
+        # Stream the body into a single buffer so large artifacts are not
+        # copied again into a decoded text string before parsing
+        with get_http_client().stream(
+            "POST",
+            self.url,
+            json=request,
+            headers=headers,
+            timeout=30.0
+        ) as response:
+            # Print the raw response for debugging
+            print(f"Received HTTP {response.status_code}")
+            print(f"Response headers: {dict(response.headers)}")
+            body = _read_body(response)
+        
+        print(f"Response body ({len(body)} bytes): {_preview(body)}")
+        return response, body
+
+
+def _error_response(rpc_id: Any, message: str) -> Dict[str, Any]:
+    # Marked so callers can tell these apart from errors reported by the agent
+    return {"jsonrpc": "2.0", "id": rpc_id, "error": {"code": _INTERNAL_ERROR, "message": message, "data": {"source": "client"}}}
+
+
+def is_client_error_response(response: Dict[str, Any]) -> bool:
+    """Whether an error response was made up by the client because the agent gave no answer."""
+    error = response.get("error")
+    return isinstance(error, dict) and isinstance(error.get("data"), dict) and error["data"].get("source") == "client"
+
+
+def _read_body(response: "httpx.Response") -> bytearray:
+    """Read a streamed response body into one growable buffer."""
+    body = bytearray()
+    for chunk in response.iter_bytes():
+        body += chunk
+    return body
+
+
+def _preview(data, limit: int = _LOG_PREVIEW_CHARS) -> str:
+    """Shorten a payload for logging without formatting the whole thing."""
+    if isinstance(data, (bytes, bytearray)):
+        text = bytes(data[:limit]).decode(errors="replace")
+    else:
+        text = data[:limit]
+    if len(data) > limit:
+        text += f"... [{len(data) - limit} more]"
+    return text
@@ -1,22 +1,108 @@
 import os
 import json
-import httpx
+import random
+import threading
+import time
 import traceback
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 from models import AgentCard, AgentSkill, AgentCapabilities, Message, Part
-from services.a2a_client import A2AClient, A2AClientHTTPError, A2AClientJSONError
+from services.agent_registry import AgentRegistryStore
+from services.a2a_client import (
+    A2AClient, A2AClientHTTPError, A2AClientJSONError, A2AClientRateLimitError, get_http_client,
+    is_client_error_response
+)
+from services.shadow import ShadowMirror
+from services.response_decoder import decode_task_result, is_raw_a2a_response
+from services.task_scheduler import TaskScheduler, TaskSchedulerError
+from services.offload import offload_pool
+from services.tracing import tracer
+
+# Task states after which an agent no longer changes a task
+TERMINAL_TASK_STATES = ("completed", "failed", "canceled")
 
 class AgentManager:
     """Manages AI agents and routes messages to the appropriate agent."""
     
-    def __init__(self):
+    def __init__(self, scheduler: Optional[TaskScheduler] = None, store: Optional[AgentRegistryStore] = None,
+                 shadow: Optional[ShadowMirror] = None):
         self.agents: Dict[str, AgentCard] = {}
         self._pending_tasks: Dict[str, Dict[str, Any]] = {}
-        # No default host agent initialization anymore
+        # Shapes outbound load so no agent gets more tasks than it can handle
+        self.scheduler = scheduler or TaskScheduler()
+        # Mirrors sampled tasks to candidate agent versions for comparison
+        self.shadow = shadow
+        # Where each agent's card was fetched from, used to refresh it
+        self._card_urls: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # Bumped whenever the set of agents or a card changes
+        self.version = 0
+        self.store = store
+        if self.store:
+            self._load_from_store()
+    
+    def _load_from_store(self) -> None:
+        """Restore agents registered before the last restart."""
+        try:
+            records = self.store.load()
+        except OSError as e:
+            # Persistence is best effort; start with an empty registry
+            print(f"Could not load agents from {self.store.directory}: {str(e)}")
+            return
+        for agent_id, record in records.items():
+            try:
+                self.agents[agent_id] = AgentCard(**record["card"])
+            except Exception as e:
+                print(f"Skipping stored agent {agent_id}: {str(e)}")
+                continue
+            if record.get("source_url"):
+                self._card_urls[agent_id] = record["source_url"]
+        print(f"Loaded {len(self.agents)} agents from {self.store.directory}")
+        # Fold the journal into a fresh snapshot so the next start reads one file
+        if self.store.has_journal_entries():
+            try:
+                self.store.compact(self._store_records())
+            except OSError as e:
+                print(f"Could not compact the agent registry in {self.store.directory}: {str(e)}")
+    
+    def _store_records(self) -> Dict[str, Dict[str, Any]]:
+        records = {}
+        for agent_id, agent in self.agents.items():
+            records[agent_id] = {"card": agent.model_dump()}
+            if agent_id in self._card_urls:
+                records[agent_id]["source_url"] = self._card_urls[agent_id]
+        return records
+    
+    def _persist(self, op: str, agent_id: str) -> None:
+        """Journal a change to an agent; call with self._lock held."""
+        if not self.store:
+            return
+        try:
+            agent = self.agents.get(agent_id)
+            self.store.record(
+                op,
+                agent_id,
+                card=agent.model_dump() if agent else None,
+                source_url=self._card_urls.get(agent_id)
+            )
+            if self.store.needs_compaction():
+                self.store.compact(self._store_records())
+        except OSError as e:
+            # Persistence is best effort; the in-memory registry stays authoritative
+            print(f"Error persisting agent {agent_id}: {str(e)}")
     
     def register_agent_from_url(self, url: str) -> Optional[AgentCard]:
         """Register an agent from its agent card URL."""
+        agent = self.fetch_agent_card(url)
+        if agent:
+            return self.register_agent(agent, source_url=url)
+        return None
+    
+    def fetch_agent_card(self, url: str) -> Optional[AgentCard]:
+        """Fetch and validate an agent card without registering it."""
+        import httpx
+        
         try:
             # Validate URL format
             if not url.startswith(('http://', 'https://')):
@@ -33,19 +119,19 @@ class AgentManager:
                 well_known_url = f"{url}/.well-known/agent.json" 
                 print(f"Attempting to fetch agent card from well-known URL: {well_known_url}")
                 try:
-                    response = httpx.get(well_known_url, timeout=15.0)
+                    response = get_http_client().get(well_known_url, timeout=15.0)
                     response.raise_for_status()
                     agent_card_url = well_known_url
                     print(f"Successfully found agent card at well-known URL")
                 except (httpx.HTTPStatusError, httpx.RequestError):
                     # If well-known path fails, try the base URL
                     print(f"No agent card found at well-known URL, trying base URL: {url}")
-                    response = httpx.get(url, timeout=15.0)
+                    response = get_http_client().get(url, timeout=15.0)
                     response.raise_for_status()
             else:
                 # URL already points to agent.json
                 print(f"Fetching agent card from URL: {url}")
-                response = httpx.get(url, timeout=15.0)
+                response = get_http_client().get(url, timeout=15.0)
                 response.raise_for_status()
             
             agent_data = response.json()
@@ -68,14 +154,13 @@ class AgentManager:
                 
             # Create the agent card
             try:
-                agent = AgentCard(**agent_data)
-                return self.register_agent(agent)
+                return AgentCard(**agent_data)
             except Exception as e:
                 print(f"Error creating AgentCard from data: {str(e)}")
                 traceback.print_exc()
                 return None
                 
-        except httpx.TimeoutError:
+        except httpx.TimeoutException:
             print(f"Timeout error connecting to agent URL {url}. The server took too long to respond.")
             return None
         except httpx.HTTPStatusError as e:
@@ -94,7 +179,7 @@ class AgentManager:
             print("The response was not valid JSON. Check if the server is returning the proper agent card format.")
             return None
         except Exception as e:
-            print(f"Error registering agent from URL {url}: {str(e)}")
+            print(f"Error fetching agent card from URL {url}: {str(e)}")
             traceback.print_exc()
             return None
     
@@ -121,13 +206,118 @@ class AgentManager:
         """Generate a unique ID for an agent based on its URL."""
         return agent.url.replace("/", "_").replace(":", "_").replace(".", "_")
     
-    def register_agent(self, agent: AgentCard) -> AgentCard:
+    def register_agent(self, agent: AgentCard, source_url: Optional[str] = None) -> AgentCard:
         """Register a new agent."""
         agent_id = self._get_agent_id(agent)
-        self.agents[agent_id] = agent
+        with self._lock:
+            self.agents[agent_id] = agent
+            if source_url:
+                self._card_urls[agent_id] = source_url
+            self.version += 1
+            self._persist("register", agent_id)
         print(f"Registered agent: {agent.name} at {agent.url}")
         return agent
     
+    def refresh_agent_card(self, agent_id: str) -> bool:
+        """Re-fetch an agent's card and update its skills and capabilities if they changed."""
+        agent = self.agents.get(agent_id)
+        if not agent:
+            return False
+        
+        fresh = self.fetch_agent_card(self._card_urls.get(agent_id, agent.url))
+        if not fresh:
+            return False
+        if fresh.skills == agent.skills and fresh.capabilities == agent.capabilities:
+            return False
+        
+        with self._lock:
+            if agent_id not in self.agents:
+                # Removed while we were fetching
+                return False
+            self.agents[agent_id] = agent.model_copy(update={
+                "skills": fresh.skills,
+                "capabilities": fresh.capabilities
+            })
+            self.version += 1
+            self._persist("update", agent_id)
+        print(f"Refreshed agent card: {agent.name}")
+        return True
+    
+    def start_card_refresher(self, interval: float, jitter: float = 0.2) -> threading.Thread:
+        """
+        Periodically refresh agent cards in a background thread.
+        
+        Each agent is refreshed about once per interval, with the pauses
+        between agents randomized by +/- jitter so refreshes do not line up.
+        """
+        def run():
+            while True:
+                agent_ids = list(self.agents) or [None]
+                pause = interval / len(agent_ids)
+                for agent_id in agent_ids:
+                    time.sleep(pause * random.uniform(1 - jitter, 1 + jitter))
+                    if agent_id is None:
+                        continue
+                    try:
+                        self.refresh_agent_card(agent_id)
+                    except Exception as e:
+                        print(f"Error refreshing agent {agent_id}: {str(e)}")
+        
+        thread = threading.Thread(target=run, name="agent-card-refresher", daemon=True)
+        thread.start()
+        return thread
+    
+    def _track_task_state(self, task_id: str, state: Optional[str]) -> None:
+        """Record a task's latest state, forgetting tasks that are finished."""
+        if state in TERMINAL_TASK_STATES:
+            self._pending_tasks.pop(task_id, None)
+        elif task_id in self._pending_tasks:
+            self._pending_tasks[task_id]["state"] = state
+    
+    def poll_pending_tasks(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Check the status of all pending tasks with batched tasks/get requests,
+        polling the agents concurrently.
+        
+        Returns the latest state of each task by task id. Finished tasks
+        are no longer tracked afterwards.
+        """
+        by_agent: Dict[str, List[str]] = {}
+        for task_id, task in list(self._pending_tasks.items()):
+            by_agent.setdefault(task["agent_id"], []).append(task_id)
+        
+        def poll(agent_id: str) -> Dict[str, Dict[str, Any]]:
+            agent = self.agents.get(agent_id)
+            if agent is None:
+                # The agent was removed, so its tasks can no longer be checked
+                for task_id in by_agent[agent_id]:
+                    self._pending_tasks.pop(task_id, None)
+                return {}
+            try:
+                responses = A2AClient(agent_card=agent).get_tasks(by_agent[agent_id])
+            except A2AClientHTTPError as e:
+                print(f"Error polling tasks of agent {agent.name}: {str(e)}")
+                return {task_id: {"agent_id": agent_id, "state": None, "error": e.message}
+                        for task_id in by_agent[agent_id]}
+            
+            statuses = {}
+            for task_id, response in responses.items():
+                state = ((response.get("result") or {}).get("status") or {}).get("state")
+                statuses[task_id] = {"agent_id": agent_id, "state": state, "error": response.get("error")}
+                if "result" in response:
+                    self._track_task_state(task_id, state)
+                elif not is_client_error_response(response):
+                    # The agent answered with an error (e.g. task not found), so stop polling it
+                    self._pending_tasks.pop(task_id, None)
+            return statuses
+        
+        statuses: Dict[str, Dict[str, Any]] = {}
+        if by_agent:
+            with ThreadPoolExecutor(max_workers=min(8, len(by_agent))) as executor:
+                for agent_statuses in executor.map(poll, list(by_agent)):
+                    statuses.update(agent_statuses)
+        return statuses
+    
     def get_agent(self, agent_id: str) -> Optional[AgentCard]:
         """Get an agent by ID."""
         return self.agents.get(agent_id)
@@ -169,7 +359,9 @@ class AgentManager:
         if message.metadata:
             print(f"Message metadata: {message.metadata}")
         
-        agent_info = self.select_agent_for_message(message)
+        with tracer.start_span("agent.select") as span:
+            agent_info = self.select_agent_for_message(message)
+            span.set_attribute("agent.id", agent_info[0] if agent_info else None)
         if not agent_info:
             # Create a system message indicating no agent is available
             response = Message(
@@ -216,29 +408,49 @@ class AgentManager:
             # Get or create a session ID from metadata
             session_id = message.metadata.get("session_id", str(uuid.uuid4()))
             
-            # Store task information
-            self._pending_tasks[task_id] = {
-                "message_id": message.id,
-                "conversation_id": message.conversation_id,
-                "agent_id": agent_id,
-                "session_id": session_id
-            }
-            
-            # Send the request using the A2A client
-            response_data = client.send_task({
-                "role": message.role,
-                "parts": parts,
-                "metadata": {
-                    "conversation_id": message.conversation_id,
+            # Wait for a free slot on the agent, sharing it fairly between users
+            fairness_key = message.metadata.get("user_id") or message.conversation_id or ""
+            with self.scheduler.slot(agent_id, fairness_key):
+                task_payload = {
+                    "role": message.role,
+                    "parts": parts,
+                    "metadata": {
+                        "conversation_id": message.conversation_id,
+                        "message_id": message.id,
+                        "task_id": task_id,
+                        "session_id": session_id
+                    }
+                }
+                mirrored = self.shadow is not None and self.shadow.sample(agent_id)
+                if mirrored:
+                    self.shadow.mirror(agent_id, task_payload)
+                
+                # Store task information; a task that never reaches the agent is forgotten again
+                self._pending_tasks[task_id] = {
                     "message_id": message.id,
-                    "task_id": task_id,
+                    "conversation_id": message.conversation_id,
+                    "agent_id": agent_id,
                     "session_id": session_id
                 }
-            }, task_id)
+                
+                # Send the request using the A2A client
+                started = time.perf_counter()
+                try:
+                    response_data = client.send_task(task_payload, task_id)
+                except Exception:
+                    self._pending_tasks.pop(task_id, None)
+                    if mirrored:
+                        self.shadow.record_primary(agent_id, time.perf_counter() - started, False, 0)
+                    raise
+                if mirrored:
+                    self.shadow.record_primary(
+                        agent_id, time.perf_counter() - started, "result" in response_data, client.last_response_size
+                    )
             
             # Parse response
             if "result" in response_data:
                 task_result = response_data["result"]
+                self._track_task_state(task_id, (task_result.get("status") or {}).get("state"))
                 
                 # Create response message
                 response_message = Message(
@@ -247,70 +459,32 @@ class AgentManager:
                     metadata={
                         "agent_id": agent_id,
                         "task_id": task_id,
-                        "session_id": task_result.get("sessionId", session_id)
+                        "session_id": task_result.get("sessionId", session_id),
+                        # Size of the agent's response, so later serialization can be offloaded
+                        "response_bytes": client.last_response_size
                     }
                 )
                 
-                # Check for artifacts format (A2A protocol v2)
-                if "artifacts" in task_result and isinstance(task_result["artifacts"], list):
-                    try:
-                        for artifact in task_result["artifacts"]:
-                            if "parts" in artifact and isinstance(artifact["parts"], list):
-                                for part in artifact["parts"]:
-                                    if part.get("type") == "text" and "text" in part:
-                                        response_message.add_text(part["text"])
-                                    elif part.get("type") == "data":
-                                        response_message.add_data(part.get("data", {}))
-                                    elif part.get("type") == "file" and "file" in part:
-                                        file_data = part["file"]
-                                        response_message.add_file(
-                                            file=file_data.get("bytes", ""),
-                                            mime_type=file_data.get("mimeType", "application/octet-stream")
-                                        )
-                    except Exception as e:
-                        print(f"Error parsing artifacts: {str(e)}")
-                        # If we fail to properly parse artifacts, return the raw JSON
-                        response_message.add_text(json.dumps(task_result))
-                
-                # Original format - Extract content from the task status
-                elif "status" in task_result and "message" in task_result["status"]:
-                    agent_message = task_result["status"]["message"]
-                    
-                    if "parts" in agent_message:
-                        for part in agent_message["parts"]:
-                            if part.get("type") == "text":
-                                response_message.add_text(part.get("text", ""))
-                            elif part.get("type") == "data":
-                                response_message.add_data(part.get("data", {}))
-                            elif part.get("type") == "file" and "file" in part:
-                                file_data = part["file"]
-                                response_message.add_file(
-                                    file=file_data.get("bytes", ""),
-                                    mime_type=file_data.get("mimeType", "application/octet-stream")
-                                )
+                # Decode artifacts or the status message into response parts
+                with tracer.start_span("a2a.decode_result") as span:
+                    parts = decode_task_result(task_result)
+                    span.set_attribute("a2a.parts", len(parts) if parts is not None else None)
+                if parts is not None:
+                    response_message.parts.extend(parts)
+                elif is_raw_a2a_response(task_result):
+                    # It's likely an A2A protocol response, keep it intact
+                    response_message.metadata["is_a2a_raw_response"] = True
+                    response_message.content = task_result
                 else:
-                    # Fallback if we can't find the message in the expected structure
-                    # Check if it looks like an A2A protocol response
-                    if ("artifacts" in task_result or "sessionId" in task_result) and task_result.get("status", {}).get("state") in ["completed", "failed"]:
-                        # It's likely an A2A protocol response, keep it intact
-                        response_message = Message(
-                            role="assistant",
-                            conversation_id=message.conversation_id,
-                            metadata={
-                                "agent_id": agent_id,
-                                "task_id": task_id,
-                                "session_id": task_result.get("sessionId", session_id),
-                                "is_a2a_raw_response": True
-                            }
-                        )
-                        response_message.content = task_result
-                    else:
-                        # Just pass the raw JSON to the client for processing
-                        response_message.add_text(json.dumps(task_result))
+                    # Just pass the raw JSON to the client for processing
+                    response_message.add_text(
+                        offload_pool.run(json.dumps, task_result, size=client.last_response_size)
+                    )
                 
                 return response_message
             else:
                 # Handle error
+                self._pending_tasks.pop(task_id, None)
                 error_message = Message(
                     role="system",
                     conversation_id=message.conversation_id
@@ -321,6 +495,25 @@ class AgentManager:
                 error_message.add_text(f"Error from agent: {error_text}")
                 return error_message
             
+        except TaskSchedulerError as e:
+            print(f"Task scheduler rejected message: {str(e)}")
+            
+            # The agent is at capacity; tell the user to retry instead of failing hard
+            response = Message(
+                role="system",
+                conversation_id=message.conversation_id
+            )
+            response.add_text(f"Agent {agent.name} is busy right now: {e.message}. Please try again in a moment.")
+            return response
+        except A2AClientRateLimitError as e:
+            print(f"Agent rate limit not lifted in time: {str(e)}")
+            
+            response = Message(
+                role="system",
+                conversation_id=message.conversation_id
+            )
+            response.add_text(f"Agent {agent.name} is rate limiting requests. Please try again in {e.retry_after:.0f} seconds.")
+            return response
         except (A2AClientHTTPError, A2AClientJSONError) as e:
             print(f"A2A client error: {str(e)}")
             traceback.print_exc()
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+class AgentRegistryStore:
+    """
+    Persists registered agents to a local directory.
+
+    The registry is kept as a snapshot file plus an append-only journal of
+    changes since the snapshot. Registrations only append one journal line;
+    the journal is folded into a fresh snapshot on load and whenever it grows
+    past ``compact_after`` entries.
+    """
+
+    SNAPSHOT_FILE = "agents.snapshot.json"
+    JOURNAL_FILE = "agents.journal.jsonl"
+
+    def __init__(self, directory: str, compact_after: int = 100):
+        self.directory = directory
+        self.compact_after = compact_after
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, self.JOURNAL_FILE)
+        self._journal_entries = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Read the snapshot and replay the journal on top of it."""
+        with self._lock:
+            records: Dict[str, Dict[str, Any]] = {}
+            if os.path.exists(self.snapshot_path):
+                try:
+                    with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                        snapshot = json.load(f)
+                    if isinstance(snapshot, dict) and isinstance(snapshot.get("agents"), dict):
+                        records = snapshot["agents"]
+                    else:
+                        print(f"Ignoring malformed agent snapshot {self.snapshot_path}")
+                except (OSError, ValueError) as e:
+                    print(f"Could not read agent snapshot {self.snapshot_path}: {str(e)}")
+
+            self._journal_entries = 0
+            if os.path.exists(self.journal_path):
+                try:
+                    with open(self.journal_path, "r", encoding="utf-8") as f:
+                        for line_number, line in enumerate(f, 1):
+                            # Unreadable lines count too, so compaction clears them out
+                            self._journal_entries += 1
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                # Most likely a write torn by a crash; everything before it is intact
+                                print(f"Skipping unreadable agent journal line {line_number}")
+                                continue
+                            if not isinstance(entry, dict):
+                                print(f"Skipping malformed agent journal line {line_number}")
+                                continue
+                            self._apply(records, entry)
+                except OSError as e:
+                    print(f"Could not read agent journal {self.journal_path}: {str(e)}")
+            return records
+
+    def record(self, op: str, agent_id: str, card: Optional[Dict[str, Any]] = None,
+               source_url: Optional[str] = None) -> None:
+        """Append a register, update or remove operation to the journal."""
+        entry = {"op": op, "agent_id": agent_id}
+        if card is not None:
+            entry["card"] = card
+        if source_url is not None:
+            entry["source_url"] = source_url
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_entries += 1
+
+    def needs_compaction(self) -> bool:
+        return self._journal_entries >= self.compact_after
+
+    def has_journal_entries(self) -> bool:
+        return self._journal_entries > 0
+
+    def compact(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """Write the full registry as a new snapshot and start an empty journal."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = self.snapshot_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"agents": records}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            # Only drop the journal once the snapshot that covers it is in place
+            open(self.journal_path, "w").close()
+            self._journal_entries = 0
+
+    @staticmethod
+    def _apply(records: Dict[str, Dict[str, Any]], entry: Dict[str, Any]) -> None:
+        agent_id = entry.get("agent_id")
+        op = entry.get("op")
+        if not agent_id:
+            return
+        if op == "remove":
+            records.pop(agent_id, None)
+        elif op in ("register", "update") and "card" in entry:
+            record = records.setdefault(agent_id, {})
+            record["card"] = entry["card"]
+            if "source_url" in entry:
+                record["source_url"] = entry["source_url"]
@@ -0,0 +1,55 @@
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+def run_batch(items: List[Dict[str, Any]], handle: Callable[[Dict[str, Any]], Dict[str, Any]],
+              max_workers: int = 16) -> Iterator[Dict[str, Any]]:
+    """
+    Run handle(item) for every item and yield the results as they complete.
+
+    Items of different conversations run concurrently; items of the same
+    conversation run one after another, in the order given, so their results
+    also come out in that order. Items without a conversation_id are
+    independent of each other. Each result carries the item's position as
+    "index" (and its "id", if it had one) and either the handler's fields
+    with status "ok", or status "error" and the error.
+
+    Closing the generator early (e.g. when the client disconnects) stops
+    items that have not started yet.
+    """
+    groups: "OrderedDict[Any, List[Tuple[int, Dict[str, Any]]]]" = OrderedDict()
+    for index, item in enumerate(items):
+        key = item.get("conversation_id") or ("new", index)
+        groups.setdefault(key, []).append((index, item))
+
+    results: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+    cancelled = threading.Event()
+
+    def run_group(entries: List[Tuple[int, Dict[str, Any]]]) -> None:
+        for index, item in entries:
+            if cancelled.is_set():
+                return
+            result: Dict[str, Any] = {"index": index}
+            if "id" in item:
+                result["id"] = item["id"]
+            try:
+                result.update(handle(item))
+                result["status"] = "ok"
+            except Exception as e:
+                result["status"] = "error"
+                result["error"] = str(e)
+            results.put(result)
+
+    if not groups:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(groups)), thread_name_prefix="batch")
+    try:
+        for entries in groups.values():
+            executor.submit(run_group, entries)
+        for _ in range(len(items)):
+            yield results.get()
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,17 +1,51 @@
-from typing import List, Optional, Dict, Any
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Tuple
 from models import Conversation, Message, Part
 import uuid
 
+# Fields restored from exported records and the types they must have, since
+# imported records skip model validation; anything else in a record is ignored
+_CONVERSATION_FIELDS = {"id": str, "name": str, "is_active": bool, "created_at": (int, float)}
+_MESSAGE_FIELDS = {"id": str, "role": str, "metadata": dict, "created_at": (int, float),
+                   "conversation_id": str, "content": object}
+_PART_FIELDS = {"type": str, "content": object, "mime_type": str}
+
+def _import_fields(record: Any, fields: Dict[str, Any], required: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+    """The known fields of a record, or None if it is malformed."""
+    if not isinstance(record, dict) or any(key not in record for key in required):
+        return None
+    values = {}
+    for key, expected in fields.items():
+        if key in record:
+            value = record[key]
+            # bool is an int subclass, but not a valid timestamp
+            if not isinstance(value, expected) or (isinstance(value, bool) and expected != bool):
+                return None
+            values[key] = value
+    return values
+
 class ConversationManager:
     """Manages conversations and their messages."""
     
     def __init__(self):
         self.conversations: Dict[str, Conversation] = {}
+        # Bumped on every change, used to build HTTP cache validators
+        self.version = 0
+        self._message_versions: Dict[str, int] = {}
+    
+    def message_version(self, conversation_id: str) -> int:
+        """Version of a conversation's message history."""
+        return self._message_versions.get(conversation_id, 0)
+    
+    def _touch(self, conversation_id: Optional[str] = None) -> None:
+        self.version += 1
+        if conversation_id:
+            self._message_versions[conversation_id] = self.version
     
     def create_conversation(self, name: str = "") -> Conversation:
         """Create a new conversation."""
         conversation = Conversation(name=name or f"Conversation {len(self.conversations) + 1}")
         self.conversations[conversation.id] = conversation
+        self._touch(conversation.id)
         return conversation
     
     def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
@@ -26,6 +60,7 @@ class ConversationManager:
         """Delete a conversation."""
         if conversation_id in self.conversations:
             del self.conversations[conversation_id]
+            self._touch(conversation_id)
             return True
         return False
     
@@ -36,6 +71,7 @@ class ConversationManager:
             # Create the conversation if it doesn't exist
             conversation = Conversation(id=conversation_id, name=f"Conversation {len(self.conversations) + 1}")
             self.conversations[conversation_id] = conversation
+            self._touch(conversation_id)
         
         message = Message(
             role=role,
@@ -58,6 +94,7 @@ class ConversationManager:
             self.conversations[conversation_id] = conversation
         
         conversation.messages.append(message)
+        self._touch(conversation_id)
     
     def list_messages(self, conversation_id: str) -> List[Message]:
         """List all messages in a conversation."""
@@ -65,4 +102,140 @@ class ConversationManager:
         if not conversation:
             return []
         
-        return conversation.messages 
\ No newline at end of file
+        return conversation.messages
+    
+    def get_message(self, conversation_id: str, message_id: str) -> Optional[Message]:
+        """Find a message by ID, looking at the newest messages first."""
+        for message in reversed(self.list_messages(conversation_id)):
+            if message.id == message_id:
+                return message
+        return None
+    
+    def list_messages_page(self, conversation_id: str, limit: int, before: Optional[int] = None) -> Tuple[List[Message], int]:
+        """
+        List up to `limit` messages that come before index `before` (or the end).
+        
+        Returns the messages and the index of the first one, which is the
+        `before` cursor for the next older page.
+        """
+        messages = self.list_messages(conversation_id)
+        end = len(messages) if before is None else max(0, min(before, len(messages)))
+        start = max(0, end - max(0, limit))
+        return messages[start:end], start
+    
+    def export_records(self, since: Optional[float] = None, until: Optional[float] = None,
+                       agent_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every conversation and its messages as flat records, one at a time.
+        
+        Each conversation record ({"type": "conversation", ...}) is followed by
+        its message records ({"type": "message", ...}). With filters, only
+        messages created in [since, until) or tagged with agent_id are
+        exported, and only conversations that have such messages.
+        """
+        filtered = since is not None or until is not None or agent_id is not None
+        for conversation in list(self.conversations.values()):
+            header = {
+                "type": "conversation",
+                "id": conversation.id,
+                "name": conversation.name,
+                "is_active": conversation.is_active,
+                "created_at": conversation.created_at
+            }
+            if not filtered:
+                yield header
+                header = None
+            
+            messages = conversation.messages
+            # Index instead of copying the list; messages are only ever appended
+            for index in range(len(messages)):
+                message = messages[index]
+                if since is not None and message.created_at < since:
+                    continue
+                if until is not None and message.created_at >= until:
+                    continue
+                if agent_id is not None and message.metadata.get("agent_id") != agent_id:
+                    continue
+                if header is not None:
+                    yield header
+                    header = None
+                yield {"type": "message", **message.dict()}
+    
+    def import_records(self, records: Iterable[Any]) -> Dict[str, int]:
+        """
+        Load records written by export_records.
+        
+        Records skip model validation; only the types of their fields are
+        checked, and malformed records are counted as skipped. Existing
+        conversations are updated, and messages whose id is already present
+        are skipped, so importing the same export twice is harmless.
+        """
+        counts = {"conversations": 0, "messages": 0, "skipped": 0}
+        known_ids: Dict[str, set] = {}
+        touched = set()
+        try:
+            for record in records:
+                record_type = record.get("type") if isinstance(record, dict) else None
+                try:
+                    if record_type == "conversation":
+                        imported = self._import_conversation(record)
+                    elif record_type == "message":
+                        imported = self._import_message(record, known_ids)
+                    else:
+                        imported = None
+                except (TypeError, AttributeError) as e:
+                    print(f"Skipping malformed import record: {str(e)}")
+                    imported = None
+                if imported is None:
+                    counts["skipped"] += 1
+                    continue
+                touched.add(imported)
+                counts["conversations" if record_type == "conversation" else "messages"] += 1
+        finally:
+            # Bump versions even if reading the records failed partway, since
+            # the records before the failure are already stored
+            for conversation_id in touched:
+                self._touch(conversation_id)
+        return counts
+    
+    def _import_conversation(self, record: Dict[str, Any]) -> Optional[str]:
+        fields = _import_fields(record, _CONVERSATION_FIELDS, ("id",))
+        if fields is None:
+            return None
+        conversation = self.get_conversation(fields["id"])
+        if conversation is None:
+            self.conversations[fields["id"]] = Conversation.model_construct(**fields)
+        else:
+            for key, value in fields.items():
+                setattr(conversation, key, value)
+        return fields["id"]
+    
+    def _import_message(self, record: Dict[str, Any], known_ids: Dict[str, set]) -> Optional[str]:
+        fields = _import_fields(record, _MESSAGE_FIELDS, ("conversation_id", "role"))
+        raw_parts = record.get("parts", [])
+        if fields is None or not isinstance(raw_parts, list):
+            return None
+        parts = []
+        for raw_part in raw_parts:
+            part_fields = _import_fields(raw_part, _PART_FIELDS, ("type", "content"))
+            if part_fields is None:
+                return None
+            parts.append(Part.model_construct(**part_fields))
+        
+        conversation_id = fields["conversation_id"]
+        conversation = self.get_conversation(conversation_id)
+        if conversation is None:
+            conversation = Conversation.model_construct(
+                id=conversation_id, name=f"Conversation {len(self.conversations) + 1}"
+            )
+            self.conversations[conversation_id] = conversation
+        ids = known_ids.get(conversation_id)
+        if ids is None:
+            ids = known_ids[conversation_id] = {message.id for message in conversation.messages}
+        if fields.get("id") in ids:
+            return None
+        
+        message = Message.model_construct(parts=parts, **fields)
+        conversation.messages.append(message)
+        ids.add(message.id)
+        return conversation_id
@@ -0,0 +1,248 @@
+import json
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401  Optional; enables HTTP/2 negotiation in the probes
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# httpcore trace events marking the start and end of each phase. HTTP/1.1 and
+# HTTP/2 connections report the request phases under different prefixes.
+_PHASE_EVENTS = {
+    "connect": ("connection.connect_tcp.started", "connection.connect_tcp.complete"),
+    "tls": ("connection.start_tls.started", "connection.start_tls.complete"),
+    "ttfb": ("send_request_headers.started", "receive_response_headers.complete"),
+    "download": ("receive_response_body.started", "receive_response_body.complete"),
+}
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+class _PhaseRecorder:
+    """Collects httpcore trace event timestamps for one request."""
+
+    def __init__(self):
+        self.events: Dict[str, float] = {}
+
+    def __call__(self, event_name: str, info: Dict[str, Any]) -> None:
+        # Strip the protocol prefix ("http11." / "http2.") from request events
+        name = event_name.split(".", 1)[1] if event_name.startswith("http") else event_name
+        self.events.setdefault(name, time.perf_counter())
+
+    def phases(self) -> Dict[str, Optional[float]]:
+        result = {}
+        for phase, (start_event, end_event) in _PHASE_EVENTS.items():
+            start, end = self.events.get(start_event), self.events.get(end_event)
+            result[f"{phase}_ms"] = _ms(end - start) if start is not None and end is not None else None
+        return result
+
+def resolve_candidates(url: str) -> Tuple[str, List[Tuple[str, str]], List[Dict[str, str]]]:
+    """Normalize the URL and list the agent card locations to probe."""
+    steps = []
+    if not url.startswith(('http://', 'https://')):
+        url = 'http://' + url
+        steps.append({"step": "URL Formatting", "status": "Modified", "message": f"Added http:// prefix: {url}"})
+    else:
+        steps.append({"step": "URL Formatting", "status": "Valid", "message": "URL has valid protocol prefix"})
+
+    original_url = url
+    url = url.rstrip('/')
+    if original_url != url:
+        steps.append({"step": "URL Cleaning", "status": "Modified", "message": f"Removed trailing slashes: {url}"})
+    else:
+        steps.append({"step": "URL Cleaning", "status": "Valid", "message": "URL had no trailing slashes"})
+
+    if url.endswith('agent.json'):
+        candidates = [(url, "Direct agent.json URL")]
+    else:
+        # Listed in order of preference; all of them are probed at once
+        candidates = [(f"{url}/.well-known/agent.json", "Well-known path"), (url, "Base URL")]
+    steps.append({
+        "step": "URL Resolution",
+        "status": "Info",
+        "message": f"Probing {len(candidates)} URL variations concurrently"
+    })
+    return url, candidates, steps
+
+def probe_url(url: str, timeout: float = 10.0) -> Dict[str, Any]:
+    """
+    Fetch a URL on a fresh connection and time each phase of the request.
+
+    DNS is timed with a separate lookup, since the connect phase reported by
+    httpcore includes its own resolution (usually answered from cache by then).
+    getaddrinfo has no timeout of its own, so the lookup runs on a separate
+    thread and is abandoned after `timeout` seconds.
+    """
+    result: Dict[str, Any] = {"url": url, "ok": False, "error": None, "status_code": None}
+
+    host = urlsplit(url).hostname or ""
+    started = time.perf_counter()
+    resolver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dns")
+    try:
+        resolver.submit(socket.getaddrinfo, host, None).result(timeout=timeout)
+        result["dns_ms"] = _ms(time.perf_counter() - started)
+    except FutureTimeoutError:
+        result["dns_ms"] = _ms(time.perf_counter() - started)
+        result["error"] = f"DNS lookup timed out after {timeout:g} seconds"
+        return result
+    except socket.gaierror as e:
+        result["dns_ms"] = _ms(time.perf_counter() - started)
+        result["error"] = f"DNS lookup failed: {str(e)}"
+        return result
+    finally:
+        # A lookup cannot be cancelled; a stuck one ends its thread when it returns
+        resolver.shutdown(wait=False)
+
+    recorder = _PhaseRecorder()
+    try:
+        with httpx.Client(http2=HTTP2_AVAILABLE, timeout=timeout) as client:
+            # Start timing after the client (and its SSL context) is set up
+            started = time.perf_counter()
+            response = client.get(url, extensions={"trace": recorder})
+    except httpx.TimeoutException:
+        result["error"] = f"Connection timed out after {timeout:g} seconds"
+        result.update(recorder.phases())
+        return result
+    except httpx.RequestError as e:
+        result["error"] = f"Request error: {str(e)}"
+        result.update(recorder.phases())
+        return result
+
+    result.update(recorder.phases())
+    result.update({
+        "total_ms": _ms(time.perf_counter() - started),
+        "status_code": response.status_code,
+        "reason": response.reason_phrase,
+        "ok": response.is_success,
+        "http_version": response.http_version,
+        "http2": response.http_version == "HTTP/2",
+        "keep_alive": _keeps_alive(response),
+        "content_encoding": response.headers.get("content-encoding"),
+        "size_bytes": len(response.content),
+        "body": response.content
+    })
+    return result
+
+def _keeps_alive(response: httpx.Response) -> bool:
+    """Whether the server left the connection open for further requests."""
+    if response.http_version == "HTTP/2":
+        return True
+    tokens = {token.strip().lower() for token in response.headers.get("connection", "").split(",")}
+    # HTTP/1.0 closes by default; HTTP/1.1 keeps the connection unless told to close
+    if response.http_version == "HTTP/1.0":
+        return "keep-alive" in tokens
+    return "close" not in tokens
+
+def _describe_timings(probe: Dict[str, Any]) -> str:
+    labels = [("DNS", "dns_ms"), ("connect", "connect_ms"), ("TLS", "tls_ms"),
+              ("TTFB", "ttfb_ms"), ("download", "download_ms")]
+    return ", ".join(f"{label} {probe[key]} ms" for label, key in labels if probe.get(key) is not None)
+
+def probe_task_round_trip(agent_url: str) -> Dict[str, Any]:
+    """Send a small tasks/send request and measure the round-trip latency."""
+    from services.a2a_client import A2AClient, A2AClientError
+
+    client = A2AClient(url=agent_url, max_rate_limit_wait=0.0)
+    started = time.perf_counter()
+    try:
+        response = client.send_task({
+            "role": "user",
+            "parts": [{"type": "text", "text": "ping"}],
+            "metadata": {"diagnostic": True}
+        }, f"diagnostic-{uuid.uuid4()}")
+    except A2AClientError as e:
+        return {"ok": False, "latency_ms": _ms(time.perf_counter() - started), "error": e.message}
+    return {
+        "ok": "result" in response,
+        "latency_ms": _ms(time.perf_counter() - started),
+        "error": None if "result" in response else response.get("error")
+    }
+
+def run_diagnostics(url: str, include_task_probe: bool = False, timeout: float = 10.0) -> Dict[str, Any]:
+    """Probe all candidate agent card URLs concurrently and report what was found."""
+    base_url, candidates, steps = resolve_candidates(url)
+    diagnostic_info: Dict[str, Any] = {
+        "url": url,
+        "steps": steps,
+        "probes": [],
+        "success": False,
+        "error": None,
+        "agent_data": None,
+        "task_probe": None
+    }
+
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        probes = list(executor.map(lambda candidate: probe_url(candidate[0], timeout), candidates))
+
+    agent_data = None
+    for (test_url, description), probe in zip(candidates, probes):
+        body = probe.pop("body", None)
+        diagnostic_info["probes"].append(probe)
+
+        if probe["error"]:
+            steps.append({"step": f"Connection Attempt ({description})", "status": "Failed", "message": probe["error"]})
+            continue
+
+        steps.append({
+            "step": f"Connection Attempt ({description})",
+            "status": "Success" if probe["ok"] else "Failed",
+            "message": f"HTTP {probe['status_code']} {probe['reason']} in {probe['total_ms']} ms ({_describe_timings(probe)})",
+            "details": {
+                "url": test_url,
+                "status_code": probe["status_code"],
+                "reason": probe["reason"],
+                "http_version": probe["http_version"],
+                "keep_alive": probe["keep_alive"],
+                "size_bytes": probe["size_bytes"]
+            }
+        })
+        # Candidates are in order of preference, so keep the first valid card
+        if not probe["ok"] or agent_data is not None:
+            continue
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            steps.append({"step": "JSON Parsing", "status": "Failed", "message": "Response is not valid JSON"})
+            continue
+
+        if not isinstance(data, dict) or "name" not in data:
+            steps.append({"step": "Agent Validation", "status": "Failed", "message": "Response missing required 'name' field"})
+            continue
+
+        agent_data = data
+        steps.append({
+            "step": "Agent Validation",
+            "status": "Success",
+            "message": f"Found valid agent: {data.get('name')} ({probe['size_bytes']} byte card)"
+        })
+        if "url" not in agent_data:
+            # Use the base URL, not the agent.json URL
+            agent_data["url"] = base_url
+            steps.append({"step": "URL Field", "status": "Modified", "message": f"Added missing URL field: {base_url}"})
+
+    if agent_data is None:
+        diagnostic_info["error"] = "Could not find a valid agent at any of the tried URLs"
+        return diagnostic_info
+
+    diagnostic_info["success"] = True
+    diagnostic_info["agent_data"] = agent_data
+
+    if include_task_probe:
+        task_probe = probe_task_round_trip(agent_data["url"])
+        diagnostic_info["task_probe"] = task_probe
+        steps.append({
+            "step": "Task Round Trip",
+            "status": "Success" if task_probe["ok"] else "Warning",
+            "message": f"tasks/send answered in {task_probe['latency_ms']} ms"
+                if task_probe["ok"] else f"tasks/send failed after {task_probe['latency_ms']} ms: {task_probe['error']}"
+        })
+    return diagnostic_info
@@ -0,0 +1,69 @@
+import threading
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, List, Optional, Tuple
+
+Event = Tuple[int, str, Any]
+
+class _ConversationEvents:
+    def __init__(self, max_events: int):
+        self.seq = 0
+        self.events: Deque[Event] = deque(maxlen=max_events)
+
+class ConversationEventLog:
+    """
+    Numbers the events sent to each conversation and keeps the most recent
+    ones so a reconnecting client can catch up on what it missed.
+
+    Sequence numbers are only meaningful within one process; `epoch` changes
+    on every restart so clients can tell when their numbers are stale.
+    """
+
+    def __init__(self, max_events: int = 200, max_conversations: int = 1000):
+        self.max_events = max_events
+        self.max_conversations = max_conversations
+        self.epoch = uuid.uuid4().hex[:8]
+        self._conversations: "OrderedDict[str, _ConversationEvents]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, conversation_id: str, event: str, payload: Any) -> int:
+        """Record an event and return its sequence number."""
+        with self._lock:
+            log = self._conversations.get(conversation_id)
+            if log is None:
+                log = _ConversationEvents(self.max_events)
+                self._conversations[conversation_id] = log
+                if len(self._conversations) > self.max_conversations:
+                    # Forget the least recently active conversation
+                    self._conversations.popitem(last=False)
+            else:
+                self._conversations.move_to_end(conversation_id)
+            log.seq += 1
+            log.events.append((log.seq, event, payload))
+            return log.seq
+
+    def last_seq(self, conversation_id: str) -> int:
+        with self._lock:
+            log = self._conversations.get(conversation_id)
+            return log.seq if log else 0
+
+    def since(self, conversation_id: str, last_seq: int, epoch: Optional[str] = None) -> Optional[List[Event]]:
+        """
+        Events after last_seq, oldest first.
+
+        Returns None if they can no longer be replayed (evicted from the
+        buffer, or numbered by a previous process) and the client must reload.
+        """
+        if epoch is not None and epoch != self.epoch:
+            return None
+        with self._lock:
+            log = self._conversations.get(conversation_id)
+            current = log.seq if log else 0
+            if last_seq > current:
+                return None
+            if last_seq == current:
+                return []
+            oldest = log.events[0][0] if log.events else current + 1
+            if last_seq + 1 < oldest:
+                return None
+            return [event for event in log.events if event[0] > last_seq]
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import uuid
+from typing import Callable, Dict, Optional
+from services.offload import offload_pool
+
+try:
+    import brotli
+except ImportError:  # Optional dependency; gzip is always available
+    brotli = None
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=5)
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=6)
+
+# Encoders in order of preference when the client accepts several equally.
+# Module-level functions, so they can run on the offload pool's processes
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    ENCODERS["br"] = _brotli
+ENCODERS["gzip"] = _gzip
+
+# Static assets are compressed once, so they get the strongest settings
+_STATIC_ENCODERS: Dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    _STATIC_ENCODERS["br"] = lambda data: brotli.compress(data, quality=11)
+_STATIC_ENCODERS["gzip"] = lambda data: gzip.compress(data, compresslevel=9)
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/javascript", "text/")
+
+# Version counters restart with the process, so tags carry a per-process epoch
+_ETAG_EPOCH = uuid.uuid4().hex[:8]
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag value from a resource name, its version and variant."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:16]
+    return f"{_ETAG_EPOCH}-{digest}"
+
+def negotiate_encoding(accept_encodings, available=ENCODERS) -> Optional[str]:
+    """Pick the best supported content coding from a parsed Accept-Encoding header."""
+    best, best_quality = None, 0
+    for encoding in ENCODERS:
+        if encoding not in available:
+            continue
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_MIMETYPES)
+
+def compress_response(response, accept_encodings, min_size: int):
+    """
+    Compress a buffered response body in place if it is large enough and the
+    client accepts a supported encoding.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or not is_compressible(response.mimetype)):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    # Large bodies are compressed on the offload pool
+    response.set_data(offload_pool.run(ENCODERS[encoding], data, size=len(data)))
+    response.headers["Content-Encoding"] = encoding
+    # A strong ETag must differ between encodings of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
+def strip_encoding_suffix(etag: str) -> str:
+    for encoding in ENCODERS:
+        if etag.endswith(f"-{encoding}"):
+            return etag[:-len(encoding) - 1]
+    return etag
+
+class _StaticAsset:
+    def __init__(self, path: str, mtime: float, data: bytes):
+        self.mtime = mtime
+        self.data = data
+        self.fingerprint = hashlib.sha256(data).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.encoded: Dict[str, bytes] = {}
+        if is_compressible(self.mimetype):
+            for encoding, encode in _STATIC_ENCODERS.items():
+                compressed = encode(data)
+                if len(compressed) < len(data):
+                    self.encoded[encoding] = compressed
+
+class StaticAssets:
+    """
+    Serves files from the static folder with content fingerprints and
+    precompressed variants kept in memory.
+
+    Templates reference assets as ``/static/<file>?v=<fingerprint>``; such
+    URLs never change content and are cached by browsers for a year.
+    """
+
+    LONG_CACHE = "public, max-age=31536000, immutable"
+
+    def __init__(self, folder: str):
+        self.folder = os.path.abspath(folder)
+        self._assets: Dict[str, _StaticAsset] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[_StaticAsset]:
+        """Load (or reload, if the file changed) an asset and its compressed variants."""
+        path = os.path.abspath(os.path.join(self.folder, filename))
+        if not path.startswith(self.folder + os.sep):
+            return None
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        asset = self._assets.get(path)
+        if asset is None or asset.mtime != mtime:
+            try:
+                with open(path, "rb") as f:
+                    asset = _StaticAsset(path, mtime, f.read())
+            except OSError:
+                return None
+            with self._lock:
+                self._assets[path] = asset
+        return asset
+
+    def fingerprint(self, filename: str) -> Optional[str]:
+        asset = self.get(filename)
+        return asset.fingerprint if asset else None
+
+    def preload(self) -> None:
+        """Fingerprint and compress every static file ahead of the first request."""
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                self.get(os.path.relpath(os.path.join(root, name), self.folder))
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+class IdempotencyError(Exception):
+    """Base class for idempotency key errors"""
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class IdempotencyKeyReusedError(IdempotencyError):
+    """The key was already used for a request with a different payload"""
+    pass
+
+class IdempotencyEntry:
+    """The state of one request submitted under an idempotency key."""
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.result: Any = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the first request to finish; True if it has."""
+        return self._done.wait(timeout)
+
+class IdempotencyStore:
+    """
+    Remembers requests by idempotency key for a limited time, so a retried
+    request can wait for the original one or reuse its result instead of
+    doing the work again.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, IdempotencyEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str = "") -> Tuple[bool, IdempotencyEntry]:
+        """
+        Claim a key.
+
+        Returns (True, entry) if the caller should process the request and then
+        call complete() or abandon(), or (False, entry) for a duplicate whose
+        result can be awaited with entry.wait().
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    raise IdempotencyKeyReusedError(
+                        f"Idempotency key '{key}' was already used for a different request"
+                    )
+                return False, entry
+
+            entry = IdempotencyEntry(fingerprint, now + self.ttl)
+            self._entries[key] = entry
+            return True, entry
+
+    def complete(self, key: str, entry: IdempotencyEntry, result: Any) -> None:
+        """Store the result and release any duplicates waiting on it."""
+        with self._lock:
+            entry.result = result
+            # Keep the result for a full TTL from now
+            entry.expires_at = time.monotonic() + self.ttl
+            if self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+        entry._done.set()
+
+    def abandon(self, key: str, entry: IdempotencyEntry) -> None:
+        """Forget a request that failed, so that a retry processes it again."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry._done.set()
+
+    def _prune(self, now: float) -> None:
+        # Entries are ordered by last update, so expired ones are at the front.
+        # An evicted in-flight request still finishes; a retry just runs again.
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) < self.max_entries:
+                break
+            del self._entries[key]
@@ -0,0 +1,54 @@
+import base64
+import gzip
+import json
+import zlib
+from typing import Any, BinaryIO, Dict, Iterable, Iterator
+
+# Output is flushed to the client in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+def _encode_default(value: Any) -> Any:
+    # File parts may hold raw bytes, which JSON cannot represent directly
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_ndjson(records: Iterable[Dict[str, Any]], compress: bool = False) -> Iterator[bytes]:
+    """
+    Serialize records as newline-delimited JSON, optionally gzip-compressed.
+
+    Records are consumed one at a time and written out in chunks, so memory
+    use does not grow with the number of records.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = bytearray()
+    for record in records:
+        buffer += json.dumps(record, default=_encode_default).encode()
+        buffer += b"\n"
+        if len(buffer) >= CHUNK_SIZE:
+            chunk = compressor.compress(buffer) if compressor else bytes(buffer)
+            buffer.clear()
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.compress(buffer) + compressor.flush()
+    elif buffer:
+        yield bytes(buffer)
+
+def decode_ndjson(stream: BinaryIO, compressed: bool = False) -> Iterator[Any]:
+    """
+    Read values from a newline-delimited JSON stream, skipping blank lines.
+
+    Values are not required to be objects; that is up to the consumer.
+    """
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {str(e)}")
+        yield value
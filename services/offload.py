@@ -0,0 +1,162 @@
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+OFFLOAD_MODES = ("off", "thread", "process")
+
+def dumps_bytes(data: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON, ready to be sent as a response body."""
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def estimate_message_size(message) -> int:
+    """
+    Rough size of a message's payload, without serializing it.
+
+    Uses the size of the agent response the message was decoded from when
+    known, otherwise the length of its text and file parts.
+    """
+    size = message.metadata.get("response_bytes", 0)
+    if size:
+        return size
+    for part in message.parts:
+        if isinstance(part.content, (str, bytes)):
+            size += len(part.content)
+    return size
+
+def _timed_call(fn: Callable, args: Tuple) -> Tuple[Any, float, float]:
+    # Runs in the worker; time.time() is comparable across processes
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time() - started
+
+def _noop() -> None:
+    pass
+
+class OffloadPool:
+    """
+    Runs CPU-heavy payload work (JSON parsing, serialization and compression
+    of large agent responses) on a worker pool.
+
+    Work below `threshold` bytes runs inline, where a hand-off would cost more
+    than it saves. The calling thread always waits for the result.
+
+    Thread mode is a concurrency cap: arguments and results are passed by
+    reference, but pure-Python work holds the GIL, so it does not finish any
+    sooner. It only keeps the heavy work to a few workers at a time, so a
+    burst of large payloads cannot occupy every request thread at once.
+    Compression releases the GIL and does run in parallel.
+
+    Process mode runs the work in parallel, but pickles arguments and results
+    on the calling thread. It is only used through run(), for work whose
+    result is bytes or a string; parse() runs inline in process mode, since
+    pickling the parsed objects back would cost about as much as parsing
+    them. It needs module-level functions and the fork start method, and
+    starts its workers right away, before the server starts its threads.
+    """
+
+    def __init__(self):
+        self.mode = "off"
+        self.threshold = 0
+        self.max_workers = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def configure(self, mode: str = "thread", max_workers: int = 2, threshold: int = 256 * 1024) -> None:
+        if mode not in OFFLOAD_MODES:
+            raise ValueError(f"Unknown offload mode '{mode}', expected one of {', '.join(OFFLOAD_MODES)}")
+        self.shutdown()
+        executor = None
+        if mode == "thread":
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="offload")
+        elif mode == "process":
+            if "fork" not in multiprocessing.get_all_start_methods():
+                print("Process offloading needs the fork start method, using threads instead")
+                mode = "thread"
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="offload")
+            else:
+                executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("fork"))
+                for future in [executor.submit(_noop) for _ in range(max_workers)]:
+                    future.result()
+        with self._lock:
+            self.mode = mode
+            self.threshold = threshold
+            self.max_workers = max_workers
+            self._executor = executor
+            self._reset_stats()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.mode = "off"
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def run(self, fn: Callable, *args, size: int = 0) -> Any:
+        """
+        Call fn(*args), on the pool if the payload is at least `threshold`
+        bytes. fn should return bytes or a string, e.g. serialize or compress.
+        """
+        executor = self._executor
+        if executor is None or size < self.threshold:
+            with self._lock:
+                self._inline += 1
+            return fn(*args)
+
+        submitted = time.time()
+        with self._lock:
+            self._queued += 1
+        try:
+            result, started, elapsed = executor.submit(_timed_call, fn, args).result()
+        finally:
+            with self._lock:
+                self._queued -= 1
+        queue_time = max(0.0, started - submitted)
+        with self._lock:
+            self._offloaded += 1
+            self._total_queue += queue_time
+            self._max_queue = max(self._max_queue, queue_time)
+            self._total_run += elapsed
+            self._max_run = max(self._max_run, elapsed)
+            self._bytes += size
+        return result
+
+    def parse(self, fn: Callable, *args, size: int = 0) -> Any:
+        """Call a parser like json.loads, on the pool in thread mode only."""
+        if self.mode == "process":
+            with self._lock:
+                self._inline += 1
+            return fn(*args)
+        return self.run(fn, *args, size=size)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            offloaded = self._offloaded or 1
+            return {
+                "mode": self.mode,
+                "workers": self.max_workers if self._executor is not None else 0,
+                "threshold": self.threshold,
+                "inline": self._inline,
+                "offloaded": self._offloaded,
+                "pending": self._queued,
+                "offloaded_bytes": self._bytes,
+                "avg_queue_ms": round(self._total_queue / offloaded * 1000, 2),
+                "max_queue_ms": round(self._max_queue * 1000, 2),
+                "avg_run_ms": round(self._total_run / offloaded * 1000, 2),
+                "max_run_ms": round(self._max_run * 1000, 2)
+            }
+
+    def _reset_stats(self) -> None:
+        self._inline = 0
+        self._offloaded = 0
+        self._queued = 0
+        self._bytes = 0
+        self._total_queue = 0.0
+        self._max_queue = 0.0
+        self._total_run = 0.0
+        self._max_run = 0.0
+
+offload_pool = OffloadPool()
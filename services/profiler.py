@@ -0,0 +1,186 @@
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Modules reported in the top-functions table
+APP_MODULE_PREFIXES = ("services.", "models.")
+
+# Innermost frames of threads that are blocked waiting rather than running.
+# Samples ending in one of these are dropped unless include_idle is set.
+IDLE_FRAMES = {
+    ("threading", "Event.wait"),
+    ("threading", "Condition.wait"),
+    ("threading", "Thread._wait_for_tstate_lock"),
+    ("selectors", "EpollSelector.select"),
+    ("selectors", "PollSelector.select"),
+    ("selectors", "SelectSelector.select"),
+    ("socket", "socket.accept"),
+    ("socketserver", "BaseServer.serve_forever"),
+    ("queue", "Queue.get"),
+}
+
+Stack = Tuple[Tuple[str, str], ...]
+
+class SamplingProfiler:
+    """
+    Periodically samples the Python stack of running threads.
+
+    Sampling reads ``sys._current_frames()`` from a background thread, so the
+    profiled code is not instrumented and runs at full speed. By default
+    samples are wall-clock: a thread waiting on the network is counted like
+    one using CPU, which is what makes slow agent calls show up. With
+    cpu_only, a thread is only sampled if its CPU clock advanced since the
+    previous sample (where the platform provides per-thread CPU clocks).
+    """
+
+    def __init__(self, interval: float = 0.01, thread_ids: Optional[Iterable[int]] = None,
+                 include_idle: bool = False, cpu_only: bool = False):
+        self.interval = interval
+        self.thread_ids: Optional[Set[int]] = set(thread_ids) if thread_ids is not None else None
+        self.include_idle = include_idle
+        self.cpu_only = cpu_only
+        self.stacks: Counter = Counter()
+        self.sample_count = 0
+        self.duration = 0.0
+        self._labels: Dict[Any, Tuple[str, str]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def run(self, duration: float) -> "SamplingProfiler":
+        """Sample for `duration` seconds, blocking the caller."""
+        self.start()
+        self._stop.wait(duration)
+        return self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        cpu_times: Dict[int, Optional[float]] = {}
+        started = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                if self.cpu_only:
+                    cpu, previous = _thread_cpu_time(thread_id), cpu_times.get(thread_id)
+                    cpu_times[thread_id] = cpu
+                    if cpu is not None and (previous is None or cpu <= previous):
+                        continue
+                stack = self._stack(frame)
+                if not self.include_idle and stack and stack[-1] in IDLE_FRAMES:
+                    continue
+                self.stacks[stack] += 1
+                self.sample_count += 1
+        self.duration = time.perf_counter() - started
+
+    def _stack(self, frame) -> Stack:
+        """The (module, function) of each frame, outermost first."""
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                name = getattr(code, "co_qualname", code.co_name)
+                label = (frame.f_globals.get("__name__", "?"), name)
+                self._labels[code] = label
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def collapsed(self) -> List[str]:
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope."""
+        return [
+            ";".join(f"{module}:{name}" for module, name in stack) + f" {count}"
+            for stack, count in self.stacks.most_common()
+        ]
+
+    def top_functions(self, prefixes: Tuple[str, ...] = APP_MODULE_PREFIXES, limit: int = 30) -> List[Dict[str, Any]]:
+        """
+        Functions in the given modules ranked by the samples they appear in.
+
+        `self` counts samples executing the function's own code, `innermost`
+        also counts time spent in library code it called (e.g. httpx), and
+        `total` counts every sample with the function anywhere on the stack.
+        """
+        totals: Counter = Counter()
+        innermost: Counter = Counter()
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            app_frames = [label for label in stack if label[0].startswith(prefixes)]
+            if not app_frames:
+                continue
+            for label in set(app_frames):
+                totals[label] += count
+            innermost[app_frames[-1]] += count
+            if stack[-1] == app_frames[-1]:
+                own[app_frames[-1]] += count
+
+        samples = self.sample_count or 1
+        return [
+            {
+                "function": f"{module}:{name}",
+                "total": count,
+                "innermost": innermost[(module, name)],
+                "self": own[(module, name)],
+                "total_pct": round(100.0 * count / samples, 1)
+            }
+            for (module, name), count in totals.most_common(limit)
+        ]
+
+    def report(self, limit: int = 30) -> Dict[str, Any]:
+        return {
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": round(self.interval * 1000, 1),
+            "samples": self.sample_count,
+            "top_functions": self.top_functions(limit=limit),
+            "collapsed": self.collapsed()
+        }
+
+def _thread_cpu_time(thread_id: int) -> Optional[float]:
+    """CPU seconds used by a thread, or None if the platform cannot tell."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError):
+        return None
+
+class ProfileStore:
+    """Keeps the reports of the most recent per-request profiles by id."""
+
+    def __init__(self, max_profiles: int = 20):
+        self._profiles: deque = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+
+    def add(self, profile_id: str, report: Dict[str, Any]) -> None:
+        with self._lock:
+            self._profiles.append((profile_id, report))
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for stored_id, report in self._profiles:
+                if stored_id == profile_id:
+                    return report
+        return None
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return [profile_id for profile_id, _ in self._profiles]
@@ -0,0 +1,158 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+class RateLimitExceeded(Exception):
+    """Capacity will not return before the caller's deadline"""
+    def __init__(self, message, retry_after: float):
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(self.message)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def _header_number(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            # Some servers send a list such as "10, 10;w=1"; the first entry applies
+            return float(value.split(",")[0].split(";")[0].strip())
+        except ValueError:
+            continue
+    return None
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the agent's feedback.
+
+    Successful requests increase the rate additively and throttling responses
+    (429, or 503 with Retry-After) cut it multiplicatively (AIMD). Rate-limit
+    headers, when present, tune the rate directly.
+    """
+
+    def __init__(self, rate: float = 20.0, burst: float = 10.0, min_rate: float = 0.1,
+                 max_rate: float = 50.0, increase: float = 0.5, decrease: float = 0.5):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = burst
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> float:
+        """
+        Take one token, sleeping until one is available.
+
+        Returns the time spent waiting. Raises RateLimitExceeded without
+        consuming a token if the wait would be longer than timeout.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 1:
+                wait = max(wait, (1 - self.tokens) / self.rate)
+            if wait > timeout:
+                raise RateLimitExceeded(
+                    f"Rate limited for another {wait:.1f}s", wait
+                )
+            # Reserve the token now so concurrent callers queue up behind us
+            self.tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        """Additive increase after a request the agent accepted."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            if headers is not None:
+                self._apply_headers(headers)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Multiplicative decrease after the agent pushed back."""
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "tokens": self.tokens,
+                "blocked_for": max(0.0, self.blocked_until - time.monotonic()),
+                "throttled": self.throttled
+            }
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _apply_headers(self, headers: Mapping[str, str]) -> None:
+        remaining = _header_number(headers, "ratelimit-remaining", "x-ratelimit-remaining")
+        reset = _header_number(headers, "ratelimit-reset", "x-ratelimit-reset")
+        if remaining is None or reset is None:
+            return
+        if reset > 1e9:
+            # Epoch timestamp rather than seconds until reset
+            reset = reset - time.time()
+        if reset <= 0:
+            return
+        if remaining < 1:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+            self.tokens = min(self.tokens, 0.0)
+        else:
+            # Spread what is left of the window evenly over the time until it resets
+            self.rate = min(self.max_rate, max(self.min_rate, remaining / reset))
+
+class RateLimiterRegistry:
+    """Holds one adaptive rate limiter per agent URL."""
+
+    def __init__(self, **limiter_options):
+        self.limiter_options = limiter_options
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> AdaptiveRateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(url)
+            if limiter is None:
+                limiter = AdaptiveRateLimiter(**self.limiter_options)
+                self._limiters[url] = limiter
+            return limiter
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {url: limiter.stats() for url, limiter in limiters.items()}
+
+# Shared by every A2AClient so all requests to an agent draw from one bucket
+rate_limiters = RateLimiterRegistry()
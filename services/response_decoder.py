@@ -0,0 +1,101 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from models import Part
+
+# Part decoders, keyed by the A2A part "type". Each decoder takes the raw part
+# dict from the agent and returns a Part, or None if the part is unusable.
+PartDecoder = Callable[[Dict[str, Any]], Optional[Part]]
+
+
+def _decode_text_part(part: Dict[str, Any]) -> Optional[Part]:
+    text = part.get("text")
+    if text is None:
+        return None
+    return Part.model_construct(type="text", content=text, mime_type="text/plain")
+
+
+def _decode_data_part(part: Dict[str, Any]) -> Optional[Part]:
+    # The decoded JSON object is handed over as-is, without copying or validating it
+    return Part.model_construct(type="data", content=part.get("data", {}), mime_type="application/json")
+
+
+def _decode_file_part(part: Dict[str, Any]) -> Optional[Part]:
+    file_data = part.get("file")
+    if not isinstance(file_data, dict):
+        return None
+    # Keep the base64 payload as the string we received; it is decoded only by the browser
+    return Part.model_construct(
+        type="file",
+        content=file_data.get("bytes", ""),
+        mime_type=file_data.get("mimeType", "application/octet-stream")
+    )
+
+
+PART_DECODERS: Dict[str, PartDecoder] = {
+    "text": _decode_text_part,
+    "data": _decode_data_part,
+    "file": _decode_file_part,
+}
+
+
+def _iter_artifact_parts(task_result: Dict[str, Any]) -> Iterator[Any]:
+    for artifact in task_result["artifacts"]:
+        if isinstance(artifact, dict) and isinstance(artifact.get("parts"), list):
+            yield from artifact["parts"]
+
+
+def _iter_status_parts(task_result: Dict[str, Any]) -> Iterator[Any]:
+    parts = task_result["status"]["message"].get("parts")
+    if isinstance(parts, list):
+        yield from parts
+
+
+def _has_artifacts(task_result: Dict[str, Any]) -> bool:
+    return isinstance(task_result.get("artifacts"), list)
+
+
+def _has_status_message(task_result: Dict[str, Any]) -> bool:
+    status = task_result.get("status")
+    return isinstance(status, dict) and isinstance(status.get("message"), dict)
+
+
+# Result layouts in order of preference: artifacts (A2A protocol v2), then the
+# original format where the reply lives in the task status message.
+RESULT_LAYOUTS = [
+    (_has_artifacts, _iter_artifact_parts),
+    (_has_status_message, _iter_status_parts),
+]
+
+
+def decode_parts(raw_parts: Iterator[Any]) -> List[Part]:
+    """Convert raw A2A parts into message parts in a single pass."""
+    parts = []
+    for raw_part in raw_parts:
+        if not isinstance(raw_part, dict):
+            continue
+        decoder = PART_DECODERS.get(raw_part.get("type"))
+        if decoder is None:
+            continue
+        part = decoder(raw_part)
+        if part is not None:
+            parts.append(part)
+    return parts
+
+
+def decode_task_result(task_result: Dict[str, Any]) -> Optional[List[Part]]:
+    """
+    Decode the result of a tasks/send call into message parts.
+
+    Returns None if the result does not match any known layout, so the caller
+    can decide how to present the raw result.
+    """
+    for matches, iter_parts in RESULT_LAYOUTS:
+        if matches(task_result):
+            return decode_parts(iter_parts(task_result))
+    return None
+
+
+def is_raw_a2a_response(task_result: Dict[str, Any]) -> bool:
+    """Check whether an undecodable result still looks like a finished A2A task."""
+    status = task_result.get("status")
+    state = status.get("state") if isinstance(status, dict) else None
+    return ("artifacts" in task_result or "sessionId" in task_result) and state in ["completed", "failed"]
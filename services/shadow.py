@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional
+
+class ShadowConfig:
+    """Where and how often to mirror one agent's tasks."""
+
+    def __init__(self, candidate_url: str, sample_rate: float):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.candidate_url = candidate_url.rstrip('/')
+        self.sample_rate = sample_rate
+
+class _Outcomes:
+    """Latency, error and size counters for one side of the comparison."""
+
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.errors = 0
+        self.response_bytes = 0
+        self.latencies: Deque[float] = deque(maxlen=max_samples)
+
+    def record(self, latency: float, ok: bool, response_size: int) -> None:
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.response_bytes += response_size
+        self.latencies.append(latency)
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "error_rate": self.errors / self.count if self.count else 0.0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "avg_response_bytes": self.response_bytes // self.count if self.count else 0
+        }
+
+class _AgentShadow:
+    def __init__(self, config: ShadowConfig, max_samples: int):
+        self.config = config
+        self.primary = _Outcomes(max_samples)
+        self.shadow = _Outcomes(max_samples)
+        self.dropped = 0
+
+class ShadowMirror:
+    """
+    Mirrors a sampled fraction of an agent's tasks/send calls to a candidate
+    URL, e.g. a new version of the agent, and compares the two.
+
+    Shadow calls run on a small thread pool, alongside the primary call.
+    Their responses are discarded; only latency, errors and response size
+    are recorded. When the pool's backlog is full, shadow calls are dropped
+    rather than queued, so mirroring never slows down users.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, max_samples: int = 1000):
+        self.max_pending = max_pending
+        self.max_samples = max_samples
+        self._shadows: Dict[str, _AgentShadow] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shadow")
+
+    def configure(self, agent_id: str, candidate_url: str, sample_rate: float) -> None:
+        """Start (or change) mirroring an agent's traffic; resets its counters."""
+        config = ShadowConfig(candidate_url, sample_rate)
+        with self._lock:
+            self._shadows[agent_id] = _AgentShadow(config, self.max_samples)
+
+    def remove(self, agent_id: str) -> bool:
+        with self._lock:
+            return self._shadows.pop(agent_id, None) is not None
+
+    def sample(self, agent_id: str) -> bool:
+        """Decide whether this call to the agent is mirrored."""
+        shadow = self._shadows.get(agent_id)
+        return shadow is not None and random.random() < shadow.config.sample_rate
+
+    def record_primary(self, agent_id: str, latency: float, ok: bool, response_size: int) -> None:
+        """Record the outcome of a primary call that was mirrored."""
+        with self._lock:
+            shadow = self._shadows.get(agent_id)
+            if shadow is not None:
+                shadow.primary.record(latency, ok, response_size)
+
+    def mirror(self, agent_id: str, payload: Dict[str, Any]) -> bool:
+        """Send a copy of a task to the agent's candidate URL in the background."""
+        with self._lock:
+            shadow = self._shadows.get(agent_id)
+            if shadow is None:
+                return False
+            if self._pending >= self.max_pending:
+                shadow.dropped += 1
+                return False
+            self._pending += 1
+        try:
+            self._executor.submit(self._run, agent_id, shadow, payload)
+        except RuntimeError:
+            # The executor is shutting down
+            with self._lock:
+                self._pending -= 1
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Primary and shadow outcomes side by side, per agent."""
+        with self._lock:
+            return {
+                agent_id: {
+                    "candidate_url": shadow.config.candidate_url,
+                    "sample_rate": shadow.config.sample_rate,
+                    "dropped": shadow.dropped,
+                    "primary": shadow.primary.summary(),
+                    "shadow": shadow.shadow.summary()
+                }
+                for agent_id, shadow in self._shadows.items()
+            }
+
+    def _run(self, agent_id: str, shadow: _AgentShadow, payload: Dict[str, Any]) -> None:
+        from services.a2a_client import A2AClient
+
+        started = time.perf_counter()
+        ok, size = False, 0
+        try:
+            # Never wait on the candidate's rate limiter; a throttled call counts as an error
+            client = A2AClient(url=shadow.config.candidate_url, max_rate_limit_wait=0.0)
+            metadata = dict(payload.get("metadata", {}), shadow=True)
+            response = client.send_task(dict(payload, metadata=metadata), f"shadow-{uuid.uuid4()}")
+            ok = "result" in response
+            size = client.last_response_size
+        except Exception as e:
+            print(f"Shadow call to {shadow.config.candidate_url} failed: {str(e)}")
+        finally:
+            latency = time.perf_counter() - started
+            with self._lock:
+                self._pending -= 1
+                # Ignore results for a configuration that was replaced meanwhile
+                if self._shadows.get(agent_id) is shadow:
+                    shadow.shadow.record(latency, ok, size)
@@ -0,0 +1,156 @@
+import builtins
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class StartupProfiler:
+    """
+    Records how long each module import and initialization phase takes
+    while the application starts.
+
+    Import times are collected by wrapping ``builtins.__import__`` between
+    start() and stop(), so they only cover modules that were not yet loaded.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.imports: Dict[str, Tuple[float, float]] = {}
+        self.phases: List[Tuple[str, float]] = []
+        self._started_at: Optional[float] = None
+        self._total: Optional[float] = None
+        self._original_import = None
+        self._thread_id = None
+        self._child_time: List[float] = []
+
+    def start(self) -> None:
+        """Begin recording imports made from the current thread."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._started_at = time.perf_counter()
+        self._thread_id = threading.get_ident()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop(self) -> None:
+        """Stop recording and restore the regular import machinery."""
+        if not self.enabled or self._original_import is None:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+        self._total = time.perf_counter() - self._started_at
+
+    def phase(self, name: str) -> "_Phase":
+        """Time an initialization step: ``with profiler.phase("managers"): ...``"""
+        return _Phase(self, name)
+
+    def report(self, limit: int = 25) -> Dict[str, Any]:
+        """Slowest imports (inclusive and self time) and phase durations, in ms."""
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return {
+            "enabled": self.enabled,
+            "total_ms": round(self._total * 1000, 1) if self._total is not None else None,
+            "phases": [{"name": name, "ms": round(elapsed * 1000, 1)} for name, elapsed in self.phases],
+            "imports": [
+                {"module": module, "ms": round(inclusive * 1000, 1), "self_ms": round(own * 1000, 1)}
+                for module, (inclusive, own) in slowest
+            ]
+        }
+
+    def print_report(self, limit: int = 15) -> None:
+        report = self.report(limit)
+        print(f"Startup profile: {report['total_ms']} ms total")
+        for phase in report["phases"]:
+            print(f"  phase  {phase['ms']:>8.1f} ms  {phase['name']}")
+        for entry in report["imports"]:
+            print(f"  import {entry['self_ms']:>8.1f} ms  {entry['module']} ({entry['ms']:.1f} ms incl.)")
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        if (level or name in sys.modules or original is None
+                or threading.get_ident() != self._thread_id):
+            return original(name, globals, locals, fromlist, level)
+
+        self._child_time.append(0.0)
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._child_time.pop()
+            self.imports.setdefault(name, (elapsed, elapsed - children))
+            if self._child_time:
+                self._child_time[-1] += elapsed
+
+class _Phase:
+    def __init__(self, profiler: StartupProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler.enabled:
+            self.profiler.phases.append((self.name, time.perf_counter() - self.started))
+        return False
+
+class WarmUp:
+    """
+    Runs warm-up tasks (connection pools, static assets, ...) in a background
+    thread after startup and reports when they are all finished.
+    """
+
+    def __init__(self):
+        self._tasks: List[Tuple[str, Callable[[], Any]]] = []
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_task(self, name: str, task: Callable[[], Any]) -> None:
+        with self._lock:
+            self._tasks.append((name, task))
+            self._status[name] = {"state": "pending", "ms": None, "error": None}
+
+    def start(self) -> None:
+        """Run all registered tasks in order in a daemon thread."""
+        thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+        thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "tasks": {name: dict(state) for name, state in self._status.items()}
+            }
+
+    def _run(self) -> None:
+        with self._lock:
+            tasks = list(self._tasks)
+        for name, task in tasks:
+            self._update(name, state="running")
+            started = time.perf_counter()
+            try:
+                task()
+                self._update(name, state="done")
+            except Exception as e:
+                # A failed warm-up only means the first request pays the cost
+                print(f"Warm-up task '{name}' failed: {str(e)}")
+                self._update(name, state="failed", error=str(e))
+            self._update(name, ms=round((time.perf_counter() - started) * 1000, 1))
+        self._done.set()
+
+    def _update(self, name: str, **fields) -> None:
+        with self._lock:
+            self._status[name].update(fields)
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Optional
+
+class TaskSchedulerError(Exception):
+    """Base class for task scheduler errors"""
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class TaskQueueFullError(TaskSchedulerError):
+    """The agent's wait queue has no room for another task"""
+    pass
+
+class TaskQueueTimeoutError(TaskSchedulerError):
+    """A task waited longer than the queue deadline for a free slot"""
+    pass
+
+class _Waiter:
+    """A task waiting for an in-flight slot."""
+
+    def __init__(self, fairness_key: str, cost: int):
+        self.fairness_key = fairness_key
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+
+class _AgentQueue:
+    """In-flight accounting and the fair wait queue of a single agent."""
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.queued = 0
+        # Deficit round robin state: one FIFO per fairness key, visited in turn
+        self.waiters: Dict[str, Deque[_Waiter]] = {}
+        self.deficits: Dict[str, int] = {}
+        self.active_keys: Deque[str] = deque()
+        # Counters exposed through stats()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+class TaskScheduler:
+    """
+    Limits the number of simultaneous tasks sent to each agent.
+
+    Tasks beyond an agent's in-flight limit wait in a bounded queue and are
+    released by deficit round robin across fairness keys (conversation or
+    user), so one busy conversation cannot starve the others.
+    """
+
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 64,
+                 queue_timeout: float = 30.0, quantum: int = 1):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.quantum = quantum
+        self._agent_limits: Dict[str, int] = {}
+        self._queues: Dict[str, _AgentQueue] = {}
+        self._lock = threading.Lock()
+
+    def set_agent_limit(self, agent_id: str, max_in_flight: int) -> None:
+        """Override the in-flight limit for one agent."""
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        with self._lock:
+            self._agent_limits[agent_id] = max_in_flight
+            queue = self._get_queue(agent_id)
+            queue.max_in_flight = max_in_flight
+            self._dispatch(queue)
+
+    @contextmanager
+    def slot(self, agent_id: str, fairness_key: str, cost: int = 1, timeout: Optional[float] = None):
+        """Hold an in-flight slot for an agent for the duration of the block."""
+        self.acquire(agent_id, fairness_key, cost, timeout)
+        try:
+            yield
+        finally:
+            self.release(agent_id)
+
+    def acquire(self, agent_id: str, fairness_key: str, cost: int = 1,
+                timeout: Optional[float] = None) -> float:
+        """Wait for an in-flight slot and return the time spent queued."""
+        if timeout is None:
+            timeout = self.queue_timeout
+
+        with self._lock:
+            queue = self._get_queue(agent_id)
+            if queue.in_flight < queue.max_in_flight and not queue.active_keys:
+                queue.in_flight += 1
+                self._record_wait(queue, 0.0)
+                return 0.0
+
+            if queue.queued >= self.max_queue:
+                queue.rejected += 1
+                raise TaskQueueFullError(
+                    f"Agent {agent_id} already has {queue.queued} tasks waiting"
+                )
+
+            waiter = _Waiter(fairness_key, cost)
+            self._enqueue(queue, waiter)
+
+        waiter.granted.wait(timeout)
+
+        with self._lock:
+            if not waiter.granted.is_set():
+                # Still queued at the deadline; give up our place
+                self._remove(queue, waiter)
+                queue.timed_out += 1
+                raise TaskQueueTimeoutError(
+                    f"Timed out after {timeout:.1f}s waiting for a free slot on agent {agent_id}"
+                )
+            return time.monotonic() - waiter.enqueued_at
+
+    def release(self, agent_id: str) -> None:
+        """Return an in-flight slot and hand it to the next waiter, if any."""
+        with self._lock:
+            queue = self._get_queue(agent_id)
+            queue.in_flight = max(0, queue.in_flight - 1)
+            self._dispatch(queue)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, in-flight count and wait times per agent."""
+        with self._lock:
+            return {
+                agent_id: {
+                    "in_flight": queue.in_flight,
+                    "max_in_flight": queue.max_in_flight,
+                    "queued": queue.queued,
+                    "max_queue": self.max_queue,
+                    "waiting_keys": len(queue.active_keys),
+                    "admitted": queue.admitted,
+                    "rejected": queue.rejected,
+                    "timed_out": queue.timed_out,
+                    "avg_wait": queue.total_wait / queue.admitted if queue.admitted else 0.0,
+                    "max_wait": queue.max_wait
+                }
+                for agent_id, queue in self._queues.items()
+            }
+
+    def _get_queue(self, agent_id: str) -> _AgentQueue:
+        queue = self._queues.get(agent_id)
+        if queue is None:
+            queue = _AgentQueue(self._agent_limits.get(agent_id, self.max_in_flight))
+            self._queues[agent_id] = queue
+        return queue
+
+    def _enqueue(self, queue: _AgentQueue, waiter: _Waiter) -> None:
+        key = waiter.fairness_key
+        if key not in queue.waiters:
+            queue.waiters[key] = deque()
+            queue.deficits[key] = 0
+            queue.active_keys.append(key)
+        queue.waiters[key].append(waiter)
+        queue.queued += 1
+
+    def _remove(self, queue: _AgentQueue, waiter: _Waiter) -> None:
+        key = waiter.fairness_key
+        waiters = queue.waiters.get(key)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        queue.queued -= 1
+        if not waiters:
+            self._drop_key(queue, key)
+
+    def _drop_key(self, queue: _AgentQueue, key: str) -> None:
+        del queue.waiters[key]
+        del queue.deficits[key]
+        queue.active_keys.remove(key)
+
+    def _dispatch(self, queue: _AgentQueue) -> None:
+        """Grant free slots to waiters in deficit round robin order."""
+        while queue.in_flight < queue.max_in_flight and queue.active_keys:
+            key = queue.active_keys[0]
+            waiters = queue.waiters[key]
+            head = waiters[0]
+            if queue.deficits[key] < head.cost:
+                # Not enough credit yet: top up and move on to the next key
+                queue.deficits[key] += self.quantum
+                queue.active_keys.rotate(-1)
+                continue
+
+            queue.deficits[key] -= head.cost
+            waiters.popleft()
+            queue.queued -= 1
+            if not waiters:
+                self._drop_key(queue, key)
+
+            queue.in_flight += 1
+            self._record_wait(queue, time.monotonic() - head.enqueued_at)
+            head.granted.set()
+
+    def _record_wait(self, queue: _AgentQueue, wait: float) -> None:
+        queue.admitted += 1
+        queue.total_wait += wait
+        queue.max_wait = max(queue.max_wait, wait)
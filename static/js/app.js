@@ -19,6 +19,9 @@ let conversations = [];
 let agents = [];
 let socket = null;
 let pendingAgentData = null;
+let lastEventSeq = {};  // conversation id -> sequence number up to which every event was received
+let seenEventSeqs = {};  // conversation id -> set of sequence numbers received after a gap
+let eventEpoch = null;  // changes when the server restarts and sequence numbers reset
 
 // Initialize app
 document.addEventListener('DOMContentLoaded', initialize);
@@ -77,14 +80,65 @@ async function createConversation() {
 
 async function loadMessages(conversationId) {
     try {
-        const response = await fetch(`/api/conversations/${conversationId}/messages`);
-        const messages = await response.json();
-        renderMessages(messages);
+        // Only the most recent page is fetched; older ones load while scrolling up
+        const response = await fetch(`/api/conversations/${conversationId}/messages?limit=${MESSAGE_PAGE_SIZE}`);
+        const page = await response.json();
+        if (conversationId !== currentConversation) return;
+        renderMessages(page.messages, page);
     } catch (error) {
         console.error('Error loading messages:', error);
     }
 }
 
+async function loadOlderMessages() {
+    const conversationId = messageList.conversationId;
+    messageList.loadingOlder = true;
+    try {
+        const response = await fetch(`/api/conversations/${conversationId}/messages?limit=${MESSAGE_PAGE_SIZE}&before=${messageList.nextBefore}`);
+        const page = await response.json();
+        if (conversationId !== messageList.conversationId) return;
+        prependMessages(page.messages, page);
+    } catch (error) {
+        console.error('Error loading older messages:', error);
+    } finally {
+        messageList.loadingOlder = false;
+    }
+}
+
+const MESSAGE_POST_ATTEMPTS = 3;
+const RETRYABLE_STATUSES = [409, 502, 503, 504];
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function postMessageWithRetry(conversationId, messageData, idempotencyKey) {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(`/api/conversations/${conversationId}/messages`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': idempotencyKey
+                },
+                body: JSON.stringify(messageData)
+            });
+            if (attempt >= MESSAGE_POST_ATTEMPTS || !RETRYABLE_STATUSES.includes(response.status)) {
+                return response;
+            }
+        } catch (error) {
+            // Network failure: the server may still be processing the message
+            if (attempt >= MESSAGE_POST_ATTEMPTS) {
+                throw error;
+            }
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+    }
+}
+
 async function sendMessage(conversationId, content) {
     try {
         const selectedAgentId = agentSelector.value;
@@ -116,19 +170,14 @@ async function sendMessage(conversationId, content) {
         // Add typing indicator
         addTypingIndicator();
         
-        // Send the message to the server
-        const response = await fetch(`/api/conversations/${conversationId}/messages`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(messageData)
-        });
+        // Send the message to the server. Retries reuse the idempotency key, so
+        // the server answers them without sending the message to the agent again.
+        const response = await postMessageWithRetry(conversationId, messageData, newIdempotencyKey());
         
         // Check if the response is ok
         if (!response.ok) {
             const errorData = await response.json();
-            throw new Error(errorData.message || 'Failed to send message');
+            throw new Error(errorData.message || errorData.error || 'Failed to send message');
         }
         
         // Response will come through WebSocket
@@ -222,34 +271,302 @@ function renderAgents() {
     });
 }
 
-function renderMessages(messages) {
+// Message list virtualization
+//
+// Only the messages inside (or near) the visible part of the chat are kept in
+// the DOM. Spacer elements above and below the rendered window stand in for
+// the rest, using measured heights for messages that have been shown and an
+// estimate for those that have not.
+const MESSAGE_PAGE_SIZE = 50;
+const ESTIMATED_MESSAGE_HEIGHT = 90;
+const OVERSCAN_PX = 800;
+const LOAD_OLDER_THRESHOLD_PX = 300;
+const STICK_TO_BOTTOM_PX = 80;
+
+const messageList = {
+    conversationId: null,
+    items: [],              // { message, height, measured }
+    rows: new Map(),        // item -> rendered row element
+    topSpacer: null,
+    windowElement: null,
+    bottomSpacer: null,
+    hasMore: false,
+    nextBefore: null,
+    loadingOlder: false,
+    renderScheduled: false,
+    stickToBottom: true
+};
+
+function resetMessageList(conversationId) {
     messagesContainer.innerHTML = ''; // Clear messages container
     welcomeMessage.classList.add('d-none');
     
+    messageList.conversationId = conversationId;
+    messageList.items = [];
+    messageList.rows = new Map();
+    messageList.hasMore = false;
+    messageList.nextBefore = null;
+    messageList.loadingOlder = false;
+    messageList.stickToBottom = true;
+    
+    messageList.topSpacer = document.createElement('div');
+    messageList.windowElement = document.createElement('div');
+    messageList.bottomSpacer = document.createElement('div');
+    messagesContainer.appendChild(messageList.topSpacer);
+    messagesContainer.appendChild(messageList.windowElement);
+    messagesContainer.appendChild(messageList.bottomSpacer);
+}
+
+function renderMessages(messages, page = {}) {
+    resetMessageList(currentConversation);
+    messageList.hasMore = Boolean(page.has_more);
+    messageList.nextBefore = page.next_before ?? null;
+    
     if (messages.length === 0) {
         // Show welcome message for new conversation
         const emptyStateMessage = document.createElement('div');
-        emptyStateMessage.className = 'text-center my-5';
+        emptyStateMessage.className = 'text-center my-5 empty-conversation';
         emptyStateMessage.innerHTML = `
             <p class="text-muted">This is the beginning of your conversation.</p>
             <p class="text-muted">Type a message to get started!</p>
         `;
-        messagesContainer.appendChild(emptyStateMessage);
+        messagesContainer.insertBefore(emptyStateMessage, messageList.topSpacer);
         
         // Make sure chat input is visible for empty conversations
         document.getElementById('chatInputContainer').classList.remove('d-none');
         return;
     }
     
-    messages.forEach(message => {
-        addMessageToUI(message);
-    });
+    messageList.items = messages.map(createMessageItem);
+    renderVisibleMessages();
+    scrollToBottom();
+}
+
+function createMessageItem(message) {
+    return { message: message, height: ESTIMATED_MESSAGE_HEIGHT, measured: false };
+}
+
+function addMessageToUI(message) {
+    if (!messageList.windowElement) {
+        resetMessageList(currentConversation);
+    }
+    const emptyState = messagesContainer.querySelector('.empty-conversation');
+    if (emptyState) {
+        emptyState.remove();
+    }
+    
+    messageList.items.push(createMessageItem(message));
+    if (messageList.stickToBottom) {
+        renderVisibleMessages();
+        scrollToBottom();
+    } else {
+        scheduleMessageRender();
+    }
+}
+
+function prependMessages(messages, page) {
+    if (messages.length === 0) {
+        messageList.hasMore = false;
+        return;
+    }
+    
+    // Keep the messages on screen in place while the older ones are added above
+    const previousHeight = messagesContainer.scrollHeight;
+    const previousScrollTop = messagesContainer.scrollTop;
     
-    // Scroll to bottom
+    messageList.items = messages.map(createMessageItem).concat(messageList.items);
+    messageList.hasMore = Boolean(page.has_more);
+    messageList.nextBefore = page.next_before ?? null;
+    updateSpacers(computeOffsets(), ...renderedRange());
+    
+    messagesContainer.scrollTop = previousScrollTop + (messagesContainer.scrollHeight - previousHeight);
+    renderVisibleMessages();
+}
+
+function scrollToBottom() {
     messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    // Estimated heights below may change once rendered, so settle on the next frame
+    requestAnimationFrame(() => {
+        if (messageList.stickToBottom) {
+            renderVisibleMessages();
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+    });
 }
 
-function addMessageToUI(message) {
+function scheduleMessageRender() {
+    if (messageList.renderScheduled) return;
+    messageList.renderScheduled = true;
+    requestAnimationFrame(() => {
+        messageList.renderScheduled = false;
+        renderVisibleMessages();
+    });
+}
+
+function computeOffsets() {
+    // offsets[i] is the top of item i; offsets[items.length] is the total height
+    const offsets = new Array(messageList.items.length + 1);
+    offsets[0] = 0;
+    for (let i = 0; i < messageList.items.length; i++) {
+        offsets[i + 1] = offsets[i] + messageList.items[i].height;
+    }
+    return offsets;
+}
+
+function findItemAt(offsets, position) {
+    // Binary search for the item that covers the given vertical position
+    let low = 0;
+    let high = messageList.items.length - 1;
+    while (low < high) {
+        const mid = (low + high) >> 1;
+        if (offsets[mid + 1] <= position) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+    return Math.max(0, low);
+}
+
+function listScrollTop() {
+    // Scroll position relative to the start of the message list
+    const listTop = messageList.topSpacer.getBoundingClientRect().top
+        - messagesContainer.getBoundingClientRect().top
+        + messagesContainer.scrollTop;
+    return messagesContainer.scrollTop - listTop;
+}
+
+function renderedRange() {
+    const indices = [];
+    messageList.items.forEach((item, index) => {
+        if (messageList.rows.has(item)) indices.push(index);
+    });
+    if (indices.length === 0) return [0, -1];
+    return [indices[0], indices[indices.length - 1]];
+}
+
+function updateSpacers(offsets, start, end) {
+    const total = offsets[messageList.items.length];
+    messageList.topSpacer.style.height = `${end >= start ? offsets[start] : 0}px`;
+    messageList.bottomSpacer.style.height = `${end >= start ? total - offsets[end + 1] : total}px`;
+}
+
+function renderVisibleMessages() {
+    const items = messageList.items;
+    if (!messageList.windowElement || items.length === 0) return;
+    
+    let offsets = computeOffsets();
+    const viewTop = listScrollTop();
+    const viewBottom = viewTop + messagesContainer.clientHeight;
+    const start = findItemAt(offsets, Math.max(0, viewTop - OVERSCAN_PX));
+    const end = findItemAt(offsets, viewBottom + OVERSCAN_PX);
+    
+    // Remember where the first visible message is so measuring does not make the view jump
+    const anchorIndex = findItemAt(offsets, Math.max(0, viewTop));
+    const anchorOffset = offsets[anchorIndex];
+    
+    // Drop rows that scrolled out of the window
+    const wanted = new Set(items.slice(start, end + 1));
+    messageList.rows.forEach((row, item) => {
+        if (!wanted.has(item)) {
+            row.remove();
+            messageList.rows.delete(item);
+        }
+    });
+    
+    // Build the window in order, reusing rows that are already rendered
+    const fragment = document.createDocumentFragment();
+    for (let i = start; i <= end; i++) {
+        const item = items[i];
+        let row = messageList.rows.get(item);
+        if (!row) {
+            row = document.createElement('div');
+            row.className = 'message-row';
+            row.appendChild(createMessageElement(item.message));
+            messageList.rows.set(item, row);
+        }
+        fragment.appendChild(row);
+    }
+    messageList.windowElement.appendChild(fragment);
+    
+    // Measure what we rendered and replace the estimates
+    for (let i = start; i <= end; i++) {
+        const item = items[i];
+        item.height = messageList.rows.get(item).offsetHeight;
+        item.measured = true;
+    }
+    offsets = computeOffsets();
+    updateSpacers(offsets, start, end);
+    
+    if (!messageList.stickToBottom && offsets[anchorIndex] !== anchorOffset) {
+        messagesContainer.scrollTop += offsets[anchorIndex] - anchorOffset;
+    }
+}
+
+function handleMessagesScroll() {
+    if (!messageList.windowElement) return;
+    
+    const distanceFromBottom = messagesContainer.scrollHeight - messagesContainer.scrollTop - messagesContainer.clientHeight;
+    messageList.stickToBottom = distanceFromBottom < STICK_TO_BOTTOM_PX;
+    
+    if (messagesContainer.scrollTop < LOAD_OLDER_THRESHOLD_PX && messageList.hasMore && !messageList.loadingOlder) {
+        loadOlderMessages();
+    }
+    scheduleMessageRender();
+}
+
+// Large payloads are shown collapsed and only formatted when expanded
+function createDeferredJsonElement(label, value) {
+    const details = document.createElement('details');
+    details.className = 'message-data';
+    
+    const summary = document.createElement('summary');
+    summary.textContent = `${label} (${describeJson(value)})`;
+    details.appendChild(summary);
+    
+    details.addEventListener('toggle', () => {
+        if (details.open && !details.querySelector('pre')) {
+            const pre = document.createElement('pre');
+            pre.className = 'text-wrap';
+            pre.textContent = JSON.stringify(value, null, 2);
+            details.appendChild(pre);
+        }
+        // The row changed height; re-measure it
+        scheduleMessageRender();
+    });
+    return details;
+}
+
+function describeJson(value) {
+    if (Array.isArray(value)) return `${value.length} items`;
+    if (value && typeof value === 'object') return `${Object.keys(value).length} fields`;
+    return typeof value;
+}
+
+function extractArtifactText(artifacts) {
+    let content = '';
+    artifacts.forEach(artifact => {
+        if (artifact.parts && Array.isArray(artifact.parts)) {
+            artifact.parts.forEach(part => {
+                if (part.type === 'text') {
+                    content += part.text;
+                } else if (part.text) {
+                    content += part.text;
+                }
+            });
+        }
+    });
+    return content;
+}
+
+function createTimestampElement(date) {
+    const timestampElement = document.createElement('div');
+    timestampElement.className = 'message-time';
+    timestampElement.textContent = date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+    return timestampElement;
+}
+
+function createMessageElement(message) {
     const messageElement = document.createElement('div');
     messageElement.className = `message ${message.role}`;
     messageElement.dataset.id = message.id;
@@ -261,30 +578,15 @@ function addMessageToUI(message) {
             const parsedMessage = JSON.parse(message);
             if (parsedMessage.artifacts && Array.isArray(parsedMessage.artifacts)) {
                 // Handle A2A protocol format
-                let content = '';
-                parsedMessage.artifacts.forEach(artifact => {
-                    if (artifact.parts && Array.isArray(artifact.parts)) {
-                        artifact.parts.forEach(part => {
-                            if (part.type === 'text') {
-                                content += part.text;
-                            } else if (part.text) {
-                                content += part.text;
-                            }
-                        });
-                    }
-                });
+                const content = extractArtifactText(parsedMessage.artifacts);
                 
                 if (content) {
                     messageElement.textContent = content;
                 } else {
-                    // Fallback: just show formatted JSON
-                    messageElement.innerHTML = `<pre class="text-wrap">${JSON.stringify(parsedMessage, null, 2)}</pre>`;
+                    // Fallback: show the JSON, formatted when expanded
+                    messageElement.appendChild(createDeferredJsonElement('Raw response', parsedMessage));
                 }
-                
-                // Add to the UI
-                messagesContainer.appendChild(messageElement);
-                messagesContainer.scrollTop = messagesContainer.scrollHeight;
-                return;
+                return messageElement;
             }
         } catch (e) {
             // Not JSON, continue with normal processing
@@ -294,67 +596,44 @@ function addMessageToUI(message) {
     
     // Handle A2A protocol format directly
     if (message.artifacts && Array.isArray(message.artifacts)) {
-        let messageContent = '';
-        message.artifacts.forEach(artifact => {
-            if (artifact.parts && Array.isArray(artifact.parts)) {
-                artifact.parts.forEach(part => {
-                    if (part.type === 'text') {
-                        messageContent += part.text;
-                    } else if (part.text) {
-                        messageContent += part.text;
-                    }
-                });
-            }
-        });
+        const messageContent = extractArtifactText(message.artifacts);
         
         if (messageContent) {
             messageElement.innerHTML = messageContent;
             
             // Add timestamp
             if (message.status && message.status.timestamp) {
-                const timestampElement = document.createElement('div');
-                timestampElement.className = 'message-time';
-                const date = new Date(message.status.timestamp);
-                timestampElement.textContent = date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
-                messageElement.appendChild(timestampElement);
+                messageElement.appendChild(createTimestampElement(new Date(message.status.timestamp)));
             }
-            
-            messagesContainer.appendChild(messageElement);
-            messagesContainer.scrollTop = messagesContainer.scrollHeight;
-            return;
+            return messageElement;
         }
     }
     
     // Standard message format processing
-    let messageContent = '';
-    
-    // Handle message.parts if it exists
     if (message.parts && Array.isArray(message.parts)) {
+        let messageContent = '';
+        const dataParts = [];
         message.parts.forEach(part => {
             if (part.type === 'text') {
                 messageContent += part.content || part.text || '';
             } else if (part.type === 'data') {
-                messageContent += `<pre class="text-wrap">${JSON.stringify(part.content, null, 2)}</pre>`;
+                dataParts.push(part.content);
             } else if (part.type === 'file' && part.mime_type && part.mime_type.startsWith('image/')) {
-                messageContent += `<img src="data:${part.mime_type};base64,${part.content}" class="img-fluid" />`;
+                messageContent += `<img src="data:${part.mime_type};base64,${part.content}" class="img-fluid" loading="lazy" />`;
             }
         });
-    } else {
+        messageElement.innerHTML = messageContent;
+        dataParts.forEach(data => messageElement.appendChild(createDeferredJsonElement('Data', data)));
+    } else if (message.content) {
         // Fallback for simple content
-        messageContent = message.content || JSON.stringify(message, null, 2);
+        messageElement.innerHTML = message.content;
+    } else {
+        messageElement.appendChild(createDeferredJsonElement('Message', message));
     }
     
-    messageElement.innerHTML = messageContent;
-    
     // Add timestamp
-    const timestampElement = document.createElement('div');
-    timestampElement.className = 'message-time';
-    const date = new Date(message.created_at * 1000 || Date.now());
-    timestampElement.textContent = date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
-    messageElement.appendChild(timestampElement);
-    
-    messagesContainer.appendChild(messageElement);
-    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    messageElement.appendChild(createTimestampElement(new Date(message.created_at * 1000 || Date.now())));
+    return messageElement;
 }
 
 function addTypingIndicator() {
@@ -406,10 +685,47 @@ function selectConversation(conversationId) {
     // Load messages
     loadMessages(conversationId);
     
-    // Join WebSocket room
-    if (socket) {
-        socket.emit('join', { conversation_id: conversationId });
+    // Join WebSocket room; the history was just reloaded, so start counting events afresh
+    delete lastEventSeq[conversationId];
+    delete seenEventSeqs[conversationId];
+    joinConversationRoom(conversationId);
+}
+
+function joinConversationRoom(conversationId) {
+    if (!socket) return;
+    const payload = { conversation_id: conversationId };
+    if (lastEventSeq[conversationId] !== undefined) {
+        // Rejoining: ask the server to replay only the events we missed
+        payload.last_seq = lastEventSeq[conversationId];
+        payload.epoch = eventEpoch;
     }
+    socket.emit('join', payload);
+}
+
+function isDuplicateEvent(meta) {
+    // Events may arrive twice around a rejoin (live and replayed), and a live
+    // event may overtake the replayed ones before it; keep the first of each
+    const conversationId = meta.conversation_id;
+    const lastSeq = lastEventSeq[conversationId];
+    if (meta.epoch !== eventEpoch || lastSeq === undefined) {
+        // Sequence numbers restarted (or none seen yet); count from this event
+        eventEpoch = meta.epoch;
+        lastEventSeq[conversationId] = meta.seq;
+        delete seenEventSeqs[conversationId];
+        return false;
+    }
+    const seen = seenEventSeqs[conversationId] || (seenEventSeqs[conversationId] = new Set());
+    if (meta.seq <= lastSeq || seen.has(meta.seq)) {
+        return true;
+    }
+    seen.add(meta.seq);
+    // Advance past every event received without a gap; the rest wait for the replay
+    let seq = lastSeq;
+    while (seen.delete(seq + 1)) {
+        seq++;
+    }
+    lastEventSeq[conversationId] = seq;
+    return false;
 }
 
 function selectAgent(agentId) {
@@ -484,7 +800,7 @@ async function fetchAgentDataForPreview(url) {
         connectionResults.classList.remove('d-none');
         connectionStatus.className = 'alert alert-info';
         connectionStatus.innerHTML = '<span class="spinner-border spinner-border-sm me-2" role="status" aria-hidden="true"></span> Testing connection...';
-        diagnosticSteps.innerHTML = '<div class="mb-2"><i class="fas fa-info-circle text-info me-1"></i> The system will automatically try these URLs in order:</div>' +
+        diagnosticSteps.innerHTML = '<div class="mb-2"><i class="fas fa-info-circle text-info me-1"></i> The system will probe these URLs at the same time, preferring the first:</div>' +
             `<div class="ms-3 mb-1">1. ${url}/.well-known/agent.json (A2A standard location)</div>` +
             `<div class="ms-3 mb-1">2. ${url} (Direct URL)</div>`;
         
@@ -674,9 +990,36 @@ function connectWebSocket() {
     
     socket.on('connect', () => {
         console.log('Connected to WebSocket');
+        // Room membership does not survive a reconnect, so join again and catch up
+        if (currentConversation) {
+            joinConversationRoom(currentConversation);
+        }
+    });
+    
+    socket.on('joined', (meta) => {
+        eventEpoch = meta.epoch;
+        if (lastEventSeq[meta.conversation_id] === undefined) {
+            lastEventSeq[meta.conversation_id] = meta.seq;
+        }
     });
     
-    socket.on('message', (message) => {
+    socket.on('resync', (meta) => {
+        // Missed events are no longer available; reload the history instead
+        eventEpoch = meta.epoch;
+        lastEventSeq[meta.conversation_id] = meta.seq;
+        delete seenEventSeqs[meta.conversation_id];
+        if (meta.conversation_id === currentConversation) {
+            loadMessages(currentConversation);
+        }
+    });
+    
+    socket.on('message', (message, meta) => {
+        if (meta) {
+            if (isDuplicateEvent(meta) || meta.conversation_id !== currentConversation) {
+                return;
+            }
+        }
+        
         // Remove typing indicator
         removeTypingIndicator();
         
@@ -698,6 +1041,9 @@ function connectWebSocket() {
                     created_at: Date.now() / 1000
                 });
             }
+        } else if (message.conversation_id && message.conversation_id !== currentConversation) {
+            // Update for a conversation that is no longer on screen
+            return;
         } else {
             // Add received message
             addMessageToUI(message);
@@ -851,6 +1197,11 @@ function setupEventListeners() {
     // Send message button
     sendMessageBtn.addEventListener('click', handleSendMessage);
     
+    // Render messages as they scroll into view
+    messagesContainer.addEventListener('scroll', handleMessagesScroll, { passive: true });
+    // Images change the height of their message once loaded ('load' does not bubble)
+    messagesContainer.addEventListener('load', scheduleMessageRender, true);
+    
     // Input keypress (Enter to send)
     messageInput.addEventListener('keypress', event => {
         if (event.key === 'Enter' && !event.shiftKey) {